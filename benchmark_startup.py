@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+起動時間ベンチマーク
+python -X importtime で kkj_search.py の読み込み時間を計測し、
+起動時に読み込むモジュールと所要時間の増加（リグレッション）を確認します
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 起動時に読み込んではいけないモジュール（必要になった時点で読み込む）
+DEFAULT_FORBIDDEN = ['openai', 'pypdf']
+
+def parse_importtime(stderr):
+    """-X importtime の出力を (モジュール名, 階層, 自身の時間[us], 累計時間[us]) のリストに変換"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            # モジュール名の字下げ（2文字ごと）が読み込みの階層を表す
+            depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+            entries.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+        except ValueError:
+            continue
+    return entries
+
+def direct_imports(entries, module):
+    """指定したモジュールが直接読み込んだモジュールを返す"""
+    for index in range(len(entries) - 1, -1, -1):
+        if entries[index][0] == module and entries[index][1] == 0:
+            break
+    else:
+        return []
+    children = []
+    for name, depth, self_us, cumulative_us in reversed(entries[:index]):
+        if depth == 0:
+            break
+        if depth == 1:
+            children.append((name, cumulative_us))
+    return children
+
+def measure(python, runs):
+    """kkj_search の読み込みを指定回数計測し、(読み込み時間[ms]のリスト, 全体時間[ms]のリスト, 最後の計測結果) を返す"""
+    import_ms = []
+    wall_ms = []
+    entries = []
+    env = dict(os.environ, PYTHONPATH=PROJECT_DIR, PYTHONDONTWRITEBYTECODE='1')
+    # ログファイルがプロジェクトに作成されないよう、一時ディレクトリで実行する
+    with tempfile.TemporaryDirectory() as work_dir:
+        for _ in range(runs):
+            started = time.perf_counter()
+            result = subprocess.run([python, '-X', 'importtime', '-c', 'import kkj_search'],
+                                    cwd=work_dir, env=env, capture_output=True, text=True)
+            wall_ms.append((time.perf_counter() - started) * 1000)
+            if result.returncode != 0:
+                print(f"エラー: kkj_search の読み込みに失敗しました\n{result.stderr[-2000:]}")
+                sys.exit(1)
+            entries = parse_importtime(result.stderr)
+            cumulative = [e[3] for e in entries if e[0] == 'kkj_search' and e[1] == 0]
+            import_ms.append(cumulative[-1] / 1000 if cumulative else 0.0)
+    return import_ms, wall_ms, entries
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='kkj_search.py の起動時間ベンチマーク')
+    parser.add_argument('--runs', type=int, default=5,
+                       help='計測回数（デフォルト: 5）')
+    parser.add_argument('--top', type=int, default=10,
+                       help='表示する読み込み時間の大きいモジュール数（デフォルト: 10）')
+    parser.add_argument('--max-ms', type=float,
+                       help='読み込み時間（中央値）の上限。超えた場合は終了コード1')
+    parser.add_argument('--forbid', default=','.join(DEFAULT_FORBIDDEN),
+                       help=f"起動時に読み込まれてはいけないモジュール（カンマ区切り、デフォルト: {','.join(DEFAULT_FORBIDDEN)}）")
+    parser.add_argument('--python', default=sys.executable,
+                       help='計測に使用するPythonインタプリタ')
+    args = parser.parse_args()
+
+    print("起動時間ベンチマーク v1.0")
+    print("=" * 40)
+
+    import_ms, wall_ms, entries = measure(args.python, max(1, args.runs))
+    import_median = statistics.median(import_ms)
+    print(f"計測回数: {len(import_ms)} 回")
+    print(f"kkj_search の読み込み時間: 中央値 {import_median:.1f} ms（最小 {min(import_ms):.1f} ms, 最大 {max(import_ms):.1f} ms）")
+    print(f"インタプリタ起動を含む全体時間: 中央値 {statistics.median(wall_ms):.1f} ms")
+
+    print(f"\n読み込み時間の大きいモジュール（kkj_search が直接読み込むもの、上位 {args.top} 件）:")
+    for name, cumulative_us in sorted(direct_imports(entries, 'kkj_search'), key=lambda c: -c[1])[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    success = True
+    loaded = {name for name, _, _, _ in entries}
+    forbidden = [module for module in args.forbid.split(',') if module and module in loaded]
+    if forbidden:
+        print(f"\n✗ 起動時に読み込まれてはいけないモジュールが読み込まれています: {', '.join(forbidden)}")
+        success = False
+    if args.max_ms is not None and import_median > args.max_ms:
+        print(f"\n✗ 読み込み時間が上限を超えています: {import_median:.1f} ms > {args.max_ms:.1f} ms")
+        success = False
+    if success:
+        print("\n✓ 起動時間のチェックに成功しました")
+
+    sys.exit(0 if success else 1)
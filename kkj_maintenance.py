@@ -3,7 +3,11 @@
 
 import sqlite3
 import json
+import csv
+import gzip
 import os
+import sys
+import time
 from datetime import datetime, timedelta
 import logging
 
@@ -14,11 +18,26 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# エクスポートする列（search_results の列に要約と一致したキーワードを加える）
+EXPORT_COLUMNS = [
+    'id', 'key', 'project_name', 'organization_name', 'cft_issue_date', 'category', 'procedure_type',
+    'location', 'tender_submission_deadline', 'opening_tenders_event', 'period_end_time',
+    'external_document_uri', 'file_type', 'file_size', 'search_keyword', 'created_at',
+    'cft_issue_date_iso', 'tender_submission_deadline_iso', 'opening_tenders_event_iso', 'period_end_time_iso',
+    'summary', 'keywords',
+]
+EXPORT_FORMATS = ('csv', 'jsonl', 'parquet')
+
 class KKJDatabaseMaintenance:
     def __init__(self, config_file='config.json'):
         """初期化"""
         self.config = self.load_config(config_file)
         self.db_path = self.config['database']['path']
+        # 1回のトランザクションで削除する件数・解放するページ数（検索処理の書き込みを長時間ブロックしない）
+        self.delete_batch_size = self.config['database'].get('delete_batch_size', 500)
+        self.vacuum_pages = self.config['database'].get('vacuum_pages', 1000)
+        # 古いレコードの移動先（作成月ごとの gzip 圧縮 JSON Lines）
+        self.archive_path = self.config['database'].get('archive_path', 'archive')
         
     def load_config(self, config_file):
         """設定ファイルの読み込み"""
@@ -29,100 +48,417 @@ class KKJDatabaseMaintenance:
         with open(config_file, 'r', encoding='utf-8') as f:
             return json.load(f)
     
-    def delete_old_records(self, days=90):
-        """指定日数より古いレコードを削除"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def get_connection(self):
+        """データベースに接続（検索処理の書き込み中はロックの解放を最大30秒待つ）"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        # トランザクションを明示的に開始・終了する
+        conn.isolation_level = None
+        return conn
+    
+    def table_exists(self, conn, table):
+        """テーブルが存在するか確認"""
+        return conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone() is not None
+    
+    def archive_records(self, conn, records, related_tables):
+        """案件を要約・キーワードとともに作成月ごとのアーカイブ（kkj_archive_YYYY-MM.jsonl.gz）に追記
+        
+        追記ごとに gzip のメンバーを追加するため、既存の内容は書き換えない（gzip.open でまとめて読み込める）。
+        """
+        keys = [record['key'] for record in records]
+        placeholders = ','.join('?' * len(keys))
+        summaries = {}
+        keywords = {}
+        if 'enrichment' in related_tables:
+            summaries = dict(conn.execute(
+                f"SELECT key, summary FROM enrichment WHERE summary IS NOT NULL AND key IN ({placeholders})", keys))
+        if 'keyword_hits' in related_tables:
+            for key, keyword in conn.execute(
+                    f"SELECT key, keyword FROM keyword_hits WHERE key IN ({placeholders}) ORDER BY rowid", keys):
+                keywords.setdefault(key, []).append(keyword)
+        
+        segments = {}
+        for record in records:
+            record.pop('id', None)
+            record['summary'] = summaries.get(record['key'])
+            record['keywords'] = keywords.get(record['key'], [])
+            segments.setdefault((record['created_at'] or '')[:7] or 'unknown', []).append(record)
+        
+        os.makedirs(self.archive_path, exist_ok=True)
+        for month, items in segments.items():
+            path = os.path.join(self.archive_path, f"kkj_archive_{month}.jsonl.gz")
+            with open(path, 'ab') as raw:
+                # 書き込みに失敗した場合は追記前の長さに戻す（途中までの gzip メンバーが残ると月全体を読めなくなる）
+                start = raw.tell()
+                try:
+                    with gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                        for item in items:
+                            f.write((json.dumps(item, ensure_ascii=False) + '\n').encode('utf-8'))
+                    # データベースから削除する前にディスクへ書き込む
+                    raw.flush()
+                    os.fsync(raw.fileno())
+                except OSError:
+                    raw.truncate(start)
+                    raise
+    
+    def delete_old_records(self, days=90, archive=False):
+        """指定日数より古いレコードを削除（archive=True の場合はアーカイブに移動）
+        
+        created_at のインデックスで古い順に delete_batch_size 件ずつ削除し、バッチごとにコミットする。
+        削除する案件の要約（enrichment）とキーワード（keyword_hits）も同じトランザクションで削除する。
+        アーカイブへの書き込み後にコミットが失敗した場合は次回に同じ案件が再度追記されるため、
+        アーカイブを読み込む側（kkj_search.py query --archive）で案件キーごとに重複を除く。
+        """
+        conn = self.get_connection()
         
         # 削除対象の日付を計算
-        delete_date = datetime.now() - timedelta(days=days)
+        delete_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
         
+        delete_count = 0
         try:
-            # 削除前の件数を取得
-            cursor.execute("SELECT COUNT(*) FROM search_results WHERE created_at < ?", 
-                          (delete_date.strftime('%Y-%m-%d %H:%M:%S'),))
-            delete_count = cursor.fetchone()[0]
-            
-            if delete_count > 0:
-                # 削除実行
-                cursor.execute("DELETE FROM search_results WHERE created_at < ?", 
-                              (delete_date.strftime('%Y-%m-%d %H:%M:%S'),))
-                conn.commit()
+            # 古いデータベースの場合はインデックスを作成（kkj_search.py の起動時にも作成される）
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_search_results_created_at ON search_results (created_at)")
+            related_tables = [table for table in ('enrichment', 'keyword_hits') if self.table_exists(conn, table)]
+            
+            while True:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    cursor = conn.execute(
+                        "SELECT * FROM search_results WHERE created_at < ? ORDER BY created_at LIMIT ?",
+                        (delete_date, self.delete_batch_size))
+                    columns = [column[0] for column in cursor.description]
+                    rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+                    if rows:
+                        ids = [(row['id'],) for row in rows]
+                        keys = [(row['key'],) for row in rows]
+                        if archive:
+                            self.archive_records(conn, rows, related_tables)
+                        conn.executemany("DELETE FROM search_results WHERE id = ?", ids)
+                        for table in related_tables:
+                            conn.executemany(f"DELETE FROM {table} WHERE key = ?", keys)
+                    conn.execute("COMMIT")
+                except (sqlite3.Error, OSError):
+                    conn.execute("ROLLBACK")
+                    raise
+                
+                delete_count += len(rows)
+                if len(rows) < self.delete_batch_size:
+                    break
+                # 検索処理が書き込めるよう、バッチの間でロックを解放する
+                time.sleep(0.05)
+            
+            if delete_count > 0 and archive:
+                logger.info(f"{days}日以前の {delete_count} 件のレコードを {self.archive_path} にアーカイブしました")
+            elif delete_count > 0:
                 logger.info(f"{days}日以前の {delete_count} 件のレコードを削除しました")
             else:
                 logger.info(f"{days}日以前のレコードはありません")
                 
         except sqlite3.Error as e:
             logger.error(f"データベースエラー: {str(e)}")
-            conn.rollback()
+            if delete_count:
+                logger.info(f"エラーまでに {delete_count} 件のレコードを削除しました")
+        except OSError as e:
+            logger.error(f"アーカイブの書き込みエラー（このバッチは削除していません）: {str(e)}")
+            if delete_count:
+                logger.info(f"エラーまでに {delete_count} 件のレコードを削除しました")
         finally:
             conn.close()
     
     def vacuum_database(self):
-        """データベースの最適化"""
-        conn = sqlite3.connect(self.db_path)
+        """データベースの最適化
+        
+        auto_vacuum=INCREMENTAL のデータベースでは、空きページを vacuum_pages ページずつ解放する
+        （ファイル全体を書き換える VACUUM と異なり、排他ロックは短時間で済む）。
+        auto_vacuum が無効の既存データベースは、初回のみ VACUUM で INCREMENTAL に変換する。
+        """
+        conn = self.get_connection()
         try:
-            conn.execute("VACUUM")
-            logger.info("データベースを最適化しました")
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                logger.info("auto_vacuum を INCREMENTAL に変換します（初回のみ VACUUM を実行）")
+                conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                conn.execute("VACUUM")
+                logger.info("データベースを最適化しました")
+                return
+            
+            freed = 0
+            while True:
+                free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                if free_pages == 0:
+                    break
+                # execute では1ページしか解放されないため、最後まで実行される executescript を使用する
+                conn.executescript(f"PRAGMA incremental_vacuum({self.vacuum_pages})")
+                remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                if remaining >= free_pages:
+                    break
+                freed += free_pages - remaining
+                # 検索処理が書き込めるよう、解放の間でロックを解放する
+                time.sleep(0.05)
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            logger.info(f"データベースを最適化しました（{freed} ページ、{freed * page_size / 1024 / 1024:.2f} MB を解放）")
         except sqlite3.Error as e:
             logger.error(f"最適化エラー: {str(e)}")
         finally:
             conn.close()
     
-    def show_statistics(self):
-        """データベースの統計情報を表示"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def export_records(self, path, export_format=None, since=None, until=None, keyword=None,
+                       organization=None, compress=False, incremental=None, batch_size=5000):
+        """案件を CSV・JSON Lines・Parquet にエクスポートし、出力した件数を返す（失敗した場合は None）
+        
+        batch_size 件ずつ読み込んで書き出すため、件数に関わらずメモリ使用量は一定。
+        since / until は公告日（YYYY-MM-DD）、organization は機関名の部分一致で絞り込む。
+        incremental に名前を指定すると、同じ名前の前回のエクスポート以降に登録された案件のみを出力する
+        （出力に成功した場合のみ、出力した位置を export_state テーブルに記録する）。
+        """
+        export_format = export_format or next(
+            (f for f in EXPORT_FORMATS if path.endswith(f'.{f}') or path.endswith(f'.{f}.gz')), 'csv')
+        compress = compress or path.endswith('.gz')
+        if compress and export_format != 'parquet' and not path.endswith('.gz'):
+            path += '.gz'
         
+        conn = self.get_connection()
         try:
-            # 全レコード数
-            cursor.execute("SELECT COUNT(*) FROM search_results")
-            total_count = cursor.fetchone()[0]
-            
-            # キーワード別件数
-            cursor.execute("""
-                SELECT search_keyword, COUNT(*) as count 
-                FROM search_results 
-                GROUP BY search_keyword 
-                ORDER BY count DESC
-            """)
-            keyword_stats = cursor.fetchall()
-            
-            # カテゴリ別件数
-            cursor.execute("""
-                SELECT category, COUNT(*) as count 
-                FROM search_results 
-                GROUP BY category 
-                ORDER BY count DESC
-            """)
-            category_stats = cursor.fetchall()
-            
-            # 最古と最新のレコード日時
-            cursor.execute("SELECT MIN(created_at), MAX(created_at) FROM search_results")
-            date_range = cursor.fetchone()
-            
-            print("\n=== データベース統計情報 ===")
-            print(f"総レコード数: {total_count}")
-            print(f"\nデータ期間: {date_range[0]} 〜 {date_range[1]}")
-            
-            print("\n--- キーワード別件数 ---")
-            for keyword, count in keyword_stats:
-                print(f"{keyword}: {count}件")
-                
-            print("\n--- カテゴリ別件数 ---")
-            for category, count in category_stats:
-                if category:
-                    print(f"{category}: {count}件")
-                    
-            # データベースファイルサイズ
-            if os.path.exists(self.db_path):
-                size = os.path.getsize(self.db_path)
-                print(f"\nデータベースファイルサイズ: {size / 1024 / 1024:.2f} MB")
-                
-        except sqlite3.Error as e:
-            logger.error(f"統計情報取得エラー: {str(e)}")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS export_state (
+                    name TEXT PRIMARY KEY,
+                    last_id INTEGER NOT NULL,
+                    exported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # 正規化した日付列がない古いデータベースでは公告日の先頭10文字で比較する
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(search_results)")}
+            issue_date = 'r.cft_issue_date_iso' if 'cft_issue_date_iso' in columns else 'substr(r.cft_issue_date, 1, 10)'
+            # 要約・キーワードのテーブルがない古いデータベースでは検索キーワードのみを使用する
+            has_enrichment = self.table_exists(conn, 'enrichment')
+            has_keyword_hits = self.table_exists(conn, 'keyword_hits')
+            select = []
+            for column in EXPORT_COLUMNS:
+                if column == 'summary':
+                    select.append("(SELECT summary FROM enrichment WHERE key = r.key) AS summary"
+                                  if has_enrichment else "NULL AS summary")
+                elif column == 'keywords':
+                    select.append("(SELECT group_concat(keyword, char(31)) FROM keyword_hits WHERE key = r.key) AS keywords"
+                                  if has_keyword_hits else "r.search_keyword AS keywords")
+                elif column in columns:
+                    select.append(f"r.{column}")
+                else:
+                    select.append(f"NULL AS {column}")
+            
+            conditions = []
+            params = []
+            last_id = 0
+            if incremental:
+                row = conn.execute("SELECT last_id FROM export_state WHERE name = ?", (incremental,)).fetchone()
+                last_id = row[0] if row else 0
+                conditions.append("r.id > ?")
+                params.append(last_id)
+            if since:
+                conditions.append(f"{issue_date} >= ?")
+                params.append(since)
+            if until:
+                conditions.append(f"{issue_date} <= ?")
+                params.append(until)
+            if keyword and has_keyword_hits:
+                conditions.append("EXISTS (SELECT 1 FROM keyword_hits WHERE key = r.key AND keyword = ?)")
+                params.append(keyword)
+            elif keyword:
+                conditions.append("r.search_keyword = ?")
+                params.append(keyword)
+            if organization:
+                conditions.append("r.organization_name LIKE ?")
+                params.append(f"%{organization}%")
+            
+            cursor = conn.execute(f'''
+                SELECT {', '.join(select)} FROM search_results r
+                {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+                ORDER BY r.id
+            ''', params)
+            
+            def batches():
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        return
+                    records = [dict(zip(EXPORT_COLUMNS, row)) for row in rows]
+                    for record in records:
+                        record['keywords'] = record['keywords'].split(chr(31)) if record['keywords'] else []
+                    yield records
+            
+            # 途中で失敗した場合に不完全なファイルが残らないよう、一時ファイルに書き出してから置き換える
+            temp_path = path + '.tmp'
+            writer = {'csv': self.write_csv, 'jsonl': self.write_jsonl, 'parquet': self.write_parquet}[export_format]
+            result = writer(temp_path, batches(), compress)
+            if result is None:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                return None
+            count, max_id = result
+            os.replace(temp_path, path)
+            
+            if incremental and max_id is not None:
+                conn.execute('''
+                    INSERT INTO export_state (name, last_id) VALUES (?, ?)
+                    ON CONFLICT (name) DO UPDATE SET last_id = excluded.last_id, exported_at = CURRENT_TIMESTAMP
+                ''', (incremental, max_id))
+            logger.info(f"{count} 件を {path} にエクスポートしました（{export_format}）")
+            return count
+            
+        except (sqlite3.Error, OSError) as e:
+            logger.error(f"エクスポートエラー: {str(e)}")
+            if os.path.exists(path + '.tmp'):
+                os.remove(path + '.tmp')
+            return None
+        finally:
+            conn.close()
+    
+    def open_export_file(self, path, compress):
+        """エクスポート先のテキストファイルを開く（compress=True の場合は gzip 圧縮）"""
+        if compress:
+            return gzip.open(path, 'wt', encoding='utf-8', newline='')
+        return open(path, 'w', encoding='utf-8', newline='')
+    
+    def write_csv(self, path, batches, compress):
+        """CSV で書き出し、(件数, 最後の id) を返す（キーワードはカンマ区切り）"""
+        count = 0
+        max_id = None
+        with self.open_export_file(path, compress) as f:
+            writer = csv.writer(f)
+            writer.writerow(EXPORT_COLUMNS)
+            for records in batches:
+                for record in records:
+                    record['keywords'] = ', '.join(record['keywords'])
+                    writer.writerow([record[column] for column in EXPORT_COLUMNS])
+                count += len(records)
+                max_id = records[-1]['id']
+        return count, max_id
+    
+    def write_jsonl(self, path, batches, compress):
+        """JSON Lines で書き出し、(件数, 最後の id) を返す"""
+        count = 0
+        max_id = None
+        with self.open_export_file(path, compress) as f:
+            for records in batches:
+                f.writelines(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+                count += len(records)
+                max_id = records[-1]['id']
+        return count, max_id
+    
+    def write_parquet(self, path, batches, compress):
+        """Parquet で書き出し、(件数, 最後の id) を返す（バッチごとに1つの行グループ、pyarrow が必要）"""
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            logger.error("Parquet での出力には pyarrow が必要です（pip install pyarrow）")
+            return None
+        
+        schema = pa.schema([
+            (column, pa.int64() if column in ('id', 'file_size') else
+                     pa.list_(pa.string()) if column == 'keywords' else pa.string())
+            for column in EXPORT_COLUMNS
+        ])
+        count = 0
+        max_id = None
+        try:
+            with pq.ParquetWriter(path, schema, compression='zstd' if compress else 'snappy') as writer:
+                for records in batches:
+                    writer.write_table(pa.Table.from_pylist(records, schema=schema))
+                    count += len(records)
+                    max_id = records[-1]['id']
+        except pa.ArrowException as e:
+            # 列の型に変換できない値（数値以外の file_size など）を含む場合
+            logger.error(f"Parquet の書き込みエラー: {type(e).__name__} - {str(e)}")
+            return None
+        return count, max_id
+    
+    def collect_statistics(self, weeks=12):
+        """集計テーブル（daily_stats）から統計情報を取得して辞書で返す
+        
+        daily_stats は kkj_search.py が案件の登録時に更新するため、案件数に依存せず短時間で集計できる。
+        daily_stats がない古いデータベースの場合は search_results から集計する。
+        """
+        conn = self.get_connection()
+        try:
+            if self.table_exists(conn, 'daily_stats'):
+                source = 'daily_stats'
+            else:
+                logger.warning("集計テーブルがないため search_results から集計します（kkj_search.py の実行時に作成されます）")
+                source = '''(
+                    SELECT date(created_at) AS day, COALESCE(search_keyword, '') AS keyword,
+                           COALESCE(category, '') AS category, COALESCE(organization_name, '') AS organization_name,
+                           COUNT(*) AS count
+                    FROM search_results GROUP BY 1, 2, 3, 4)'''
+            
+            def grouped(column):
+                return [{column: value, 'count': count} for value, count in conn.execute(
+                    f"SELECT {column}, SUM(count) AS total FROM {source} GROUP BY {column} ORDER BY total DESC")]
+            
+            total_count, first_day, last_day = conn.execute(
+                f"SELECT COALESCE(SUM(count), 0), MIN(day), MAX(day) FROM {source}").fetchone()
+            
+            # 週（月曜日始まり）ごとの新規件数
+            week = "date(day, 'weekday 0', '-6 days')"
+            since = f"date('now', 'weekday 0', '-{weeks * 7 - 1} days')"
+            weekly = [{'week': w, 'count': count} for w, count in conn.execute(
+                f"SELECT {week} AS week, SUM(count) FROM {source} WHERE day >= {since} GROUP BY week ORDER BY week")]
+            weekly_by_category = [{'week': w, 'category': category, 'count': count} for w, category, count in conn.execute(
+                f"SELECT {week} AS week, category, SUM(count) AS total FROM {source} WHERE day >= {since} "
+                f"GROUP BY week, category ORDER BY week, total DESC")]
+            
+            return {
+                'total_count': total_count,
+                'first_day': first_day,
+                'last_day': last_day,
+                'keywords': grouped('keyword'),
+                'categories': grouped('category'),
+                'organizations': grouped('organization_name'),
+                'weekly': weekly,
+                'weekly_by_category': weekly_by_category,
+                'database_size_bytes': os.path.getsize(self.db_path) if os.path.exists(self.db_path) else None,
+            }
         finally:
             conn.close()
+    
+    def show_statistics(self, as_json=False, weeks=12):
+        """データベースの統計情報を表示（as_json=True の場合は JSON で出力）"""
+        try:
+            stats = self.collect_statistics(weeks)
+        except sqlite3.Error as e:
+            logger.error(f"統計情報取得エラー: {str(e)}")
+            return
+        
+        if as_json:
+            print(json.dumps(stats, ensure_ascii=False, indent=2))
+            return
+        
+        print("\n=== データベース統計情報 ===")
+        print(f"総レコード数: {stats['total_count']}（アーカイブ・削除済みを含む）")
+        print(f"\nデータ期間: {stats['first_day']} 〜 {stats['last_day']}")
+        
+        print("\n--- キーワード別件数 ---")
+        for row in stats['keywords']:
+            print(f"{row['keyword']}: {row['count']}件")
+            
+        print("\n--- カテゴリ別件数 ---")
+        for row in stats['categories']:
+            if row['category']:
+                print(f"{row['category']}: {row['count']}件")
+        
+        print("\n--- 機関別件数 ---")
+        for row in stats['organizations']:
+            if row['organization_name']:
+                print(f"{row['organization_name']}: {row['count']}件")
+        
+        print(f"\n--- 週別新規件数（直近{weeks}週） ---")
+        for row in stats['weekly']:
+            categories = ', '.join(f"{c['category'] or '不明'} {c['count']}件"
+                                   for c in stats['weekly_by_category'] if c['week'] == row['week'])
+            print(f"{row['week']}〜: {row['count']}件（{categories}）")
+                
+        # データベースファイルサイズ
+        if stats['database_size_bytes'] is not None:
+            print(f"\nデータベースファイルサイズ: {stats['database_size_bytes'] / 1024 / 1024:.2f} MB")
 
 if __name__ == "__main__":
     import argparse
@@ -130,18 +466,46 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='官公需情報データベースメンテナンス')
     parser.add_argument('--delete-days', type=int, default=90,
                        help='指定日数より古いレコードを削除 (デフォルト: 90日)')
+    parser.add_argument('--archive', action='store_true',
+                       help='古いレコードを削除せずにアーカイブ（database.archive_path）へ移動')
     parser.add_argument('--vacuum', action='store_true',
                        help='データベースの最適化を実行')
     parser.add_argument('--stats', action='store_true',
                        help='統計情報を表示')
+    parser.add_argument('--export', metavar='PATH',
+                       help='データベースの案件（アーカイブ済みを除く）をファイルにエクスポート（形式は --format または拡張子 .csv / .jsonl / .parquet で指定）')
+    parser.add_argument('--format', choices=EXPORT_FORMATS,
+                       help='--export の出力形式（省略時は拡張子から判定、判定できない場合は csv）')
+    parser.add_argument('--since', metavar='YYYY-MM-DD',
+                       help='--export: 公告日がこの日以降の案件のみ')
+    parser.add_argument('--until', metavar='YYYY-MM-DD',
+                       help='--export: 公告日がこの日以前の案件のみ')
+    parser.add_argument('--keyword',
+                       help='--export: 指定したキーワードに一致した案件のみ')
+    parser.add_argument('--organization',
+                       help='--export: 機関名に指定した文字列を含む案件のみ')
+    parser.add_argument('--compress', action='store_true',
+                       help='--export: gzip で圧縮（Parquet の場合は zstd で圧縮）')
+    parser.add_argument('--incremental', nargs='?', const='default', metavar='NAME',
+                       help='--export: 同じ名前での前回のエクスポート以降に登録された案件のみを出力')
+    parser.add_argument('--json', action='store_true',
+                       help='--stats と併用: 統計情報を JSON で出力')
+    parser.add_argument('--weeks', type=int, default=12,
+                       help='--stats で表示する週別件数の週数（デフォルト: 12）')
     
     args = parser.parse_args()
     
     maintenance = KKJDatabaseMaintenance()
     
-    if args.stats:
-        maintenance.show_statistics()
+    if args.export:
+        count = maintenance.export_records(
+            args.export, export_format=args.format, since=args.since, until=args.until,
+            keyword=args.keyword, organization=args.organization, compress=args.compress,
+            incremental=args.incremental)
+        sys.exit(0 if count is not None else 1)
+    elif args.stats:
+        maintenance.show_statistics(as_json=args.json, weeks=args.weeks)
     else:
-        maintenance.delete_old_records(args.delete_days)
+        maintenance.delete_old_records(args.delete_days, archive=args.archive)
         if args.vacuum:
             maintenance.vacuum_database()
\ No newline at end of file
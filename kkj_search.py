@@ -2,22 +2,46 @@
 # -*- coding: utf-8 -*-
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import HTTPError as Urllib3HTTPError
+from urllib.parse import urlparse
+import random
+import hashlib
+import unicodedata
+import re
+from collections import deque
 import xml.etree.ElementTree as ET
 import sqlite3
+import gzip
+import zlib
 import smtplib
+import socket
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from email.utils import formataddr
-from datetime import datetime
+from email.utils import formataddr, parseaddr, getaddresses
+from email import message_from_string
+from datetime import datetime, date, timedelta
 import json
 import os
 import logging
 import time
 import sys
 import tempfile
-import openai
-from pypdf import PdfReader
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
 import io
+import signal
+try:
+    import resource
+except ImportError:  # Windowsでは利用できない
+    resource = None
+try:
+    import fcntl
+except ImportError:  # Windowsでは利用できない
+    fcntl = None
 
 # ログ設定
 logging.basicConfig(
@@ -30,22 +54,845 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+class SearchRecord:
+    """検索結果1件分のレコード（辞書と同様に record['key'] でも参照可能）"""
+    __slots__ = (
+        'key', 'project_name', 'organization_name', 'cft_issue_date',
+        'category', 'procedure_type', 'location', 'tender_submission_deadline',
+        'opening_tenders_event', 'period_end_time', 'external_document_uri',
+        'file_type', 'file_size', 'search_keyword'
+    )
+    # XMLタグ名 → フィールド名
+    TAG_FIELDS = {
+        'Key': 'key',
+        'ProjectName': 'project_name',
+        'OrganizationName': 'organization_name',
+        'CftIssueDate': 'cft_issue_date',
+        'Category': 'category',
+        'ProcedureType': 'procedure_type',
+        'Location': 'location',
+        'TenderSubmissionDeadline': 'tender_submission_deadline',
+        'OpeningTendersEvent': 'opening_tenders_event',
+        'PeriodEndTime': 'period_end_time',
+        'ExternalDocumentURI': 'external_document_uri',
+        'FileType': 'file_type',
+        'FileSize': 'file_size',
+    }
+    
+    def __init__(self, search_keyword=None):
+        for name in self.__slots__:
+            setattr(self, name, None)
+        self.search_keyword = search_keyword
+    
+    @classmethod
+    def from_element(cls, element, search_keyword):
+        """SearchResult要素から子要素を1回走査してレコードを作成"""
+        record = cls(search_keyword)
+        for child in element:
+            name = cls.TAG_FIELDS.get(child.tag)
+            if name is None or not child.text:
+                continue
+            if name == 'file_size':
+                try:
+                    record.file_size = int(child.text)
+                except ValueError:
+                    pass
+            else:
+                setattr(record, name, child.text)
+        return record
+    
+    def __getitem__(self, name):
+        return getattr(self, name)
+    
+    def __setitem__(self, name, value):
+        setattr(self, name, value)
+    
+    def get(self, name, default=None):
+        return getattr(self, name, default)
+    
+    def to_dict(self):
+        """辞書に変換"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+def iter_xml_results(source, search_keyword, on_hits=None):
+    """APIのXMLレスポンスを逐次パースし、SearchRecordを1件ずつ返す
+    
+    source には文字列・バイト列のほか、ストリーミング中のレスポンス本文など
+    ファイルライクオブジェクトを指定できる。SearchHitsを読み取った時点で on_hits が呼ばれる。
+    """
+    if isinstance(source, str):
+        source = io.BytesIO(source.encode('utf-8'))
+    elif isinstance(source, bytes):
+        source = io.BytesIO(source)
+    
+    container = None
+    for event, element in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            if element.tag == 'SearchResults':
+                container = element
+            continue
+        
+        if element.tag == 'SearchResult':
+            yield SearchRecord.from_element(element, search_keyword)
+            # パース済みの要素を解放してメモリ使用量を一定に保つ
+            element.clear()
+            if container is not None:
+                container.remove(element)
+        elif element.tag == 'SearchHits':
+            logger.info(f"検索ヒット数: {element.text}")
+            if on_hits and element.text and element.text.isdigit():
+                on_hits(int(element.text))
+        elif element.tag == 'Error':
+            logger.error(f"APIエラー: {element.text}")
+            return
+
+# アーカイブの1行（json.dumps の既定の区切り）から案件キーを取り出す（JSONとして解析せずに判定するため）
+ARCHIVE_KEY_PATTERN = re.compile(r'"key": "((?:[^"\\]|\\.)*)"')
+
+def iter_archive_lines(archive_dir):
+    """kkj_maintenance.py --archive で移動した案件（kkj_archive_YYYY-MM.jsonl.gz）を古い月から順に1行ずつ返す"""
+    if not os.path.isdir(archive_dir):
+        return
+    for name in sorted(os.listdir(archive_dir)):
+        if not (name.startswith('kkj_archive_') and name.endswith('.jsonl.gz')):
+            continue
+        try:
+            with gzip.open(os.path.join(archive_dir, name), 'rt', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        yield line
+        except (OSError, EOFError, zlib.error, ValueError) as e:
+            # 破損したアーカイブは読み込めた部分までを使用し、残りはスキップする
+            logger.error(f"アーカイブ {name} を読み込めません（以降をスキップします）: {type(e).__name__} - {str(e)}")
+
+# 要約プロンプト（内容を変更した場合は SUMMARY_PROMPT_VERSION を上げてキャッシュを無効化する）
+SUMMARY_PROMPT_VERSION = 2
+SUMMARY_PROMPT = """以下は官公需の入札案件PDFから抽出したテキストです。
+以下に従い、情報を抽出してください。ただし、Markdown形式にせず、各項目は：の後に出力し、改行するにととどめてください。
+例えば次のように出力します。
+「案件の概要：〜〜〜
+履行期間：〜〜〜
+要求元：〜〜〜」
+また、以下の通り各項目を抽出しました、等の説明は不要です。各項目の抽出だけ行ってください。
+抽出する情報は下記のとおりです。
+・案件の概要
+・履行期間
+・要求元
+・入札方式
+・参加表明期限
+・履行体制に関する資料提出期限
+・提案書などの提出期限
+・入札日時
+・入札制限の記載
+
+{text}"""
+
+# 要約で抽出する項目ごとの手がかり語（本文から関連箇所を選ぶために使用）
+SUMMARY_FIELD_CUES = {
+    '案件の概要': ('件名', '概要', '目的', '業務内容', '調達内容', '調達件名', '仕様'),
+    '履行期間': ('履行期間', '契約期間', '履行期限', '納入期限', '納期'),
+    '要求元': ('要求元', '要求部局', '担当部局', '契約担当官', '支出負担行為担当官', '担当部署'),
+    '入札方式': ('一般競争', '指名競争', '企画競争', '総合評価', '入札方式', '公募', '随意契約'),
+    '参加表明期限': ('参加表明', '参加意思', '参加申請', '参加希望'),
+    '履行体制に関する資料提出期限': ('履行体制', '資料の提出', '資料提出'),
+    '提案書などの提出期限': ('提案書', '企画書', '提出期限', '受領期限'),
+    '入札日時': ('入札日時', '開札', '入札書の提出', '入札執行', '入札及び開札'),
+    '入札制限の記載': ('競争参加資格', '参加資格', '参加条件', '制限', '等級'),
+}
+# 日付・時刻らしい表記（和暦・西暦・月日・時刻）
+DATE_CUE_PATTERN = re.compile(
+    r'(?:令和|平成|R|Ｒ|H|Ｈ)\s*[0-9０-９元]{1,2}\s*[年.．/／]\s*[0-9０-９]{1,2}'
+    r'|[0-9０-９]{4}\s*[年/／\-.．]\s*[0-9０-９]{1,2}'
+    r'|[0-9０-９]{1,2}\s*月\s*[0-9０-９]{1,2}\s*日'
+    r'|[0-9０-９]{1,2}\s*[時:：]\s*[0-9０-９]{2}'
+)
+# 段落の区切りとみなす見出し（1. / (1) / 第1 / ① / ■ など）
+SECTION_HEADING_PATTERN = re.compile(
+    r'^\s*(?:[0-9０-９]+\s*[.．、)）]|[(（][0-9０-９一二三四五六七八九十]+[)）]|第[0-9０-９一二三四五六七八九十]+'
+    r'|[一二三四五六七八九十]+\s*[、.．]|[①-⑳]|[■□●○◆◇【])'
+)
+
+def estimate_tokens(text):
+    """トークン数の概算（英数字は約4文字、日本語は約1文字で1トークン）"""
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars)
+
+def find_summary_fields(text):
+    """テキストに手がかり語が含まれる要約項目の集合を返す"""
+    return {field for field, cues in SUMMARY_FIELD_CUES.items() if any(cue in text for cue in cues)}
+
+def split_text_chunks(text, max_chunk_chars=300):
+    """テキストを見出し・空行で段落に分割（長い段落は行単位でさらに分割）"""
+    chunks = []
+    current = []
+    size = 0
+    for line in text.splitlines():
+        line = line.strip()
+        if current and (not line or SECTION_HEADING_PATTERN.match(line) or size + len(line) > max_chunk_chars):
+            chunks.append("\n".join(current))
+            current = []
+            size = 0
+        # 1行が長すぎる場合は文字数で分割
+        while len(line) > max_chunk_chars:
+            chunks.append(line[:max_chunk_chars])
+            line = line[max_chunk_chars:]
+        if line:
+            current.append(line)
+            size += len(line) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+def select_relevant_text(text, max_tokens):
+    """要約項目の手がかり語・日付表記を含む段落を優先して、トークン数の上限内に収める
+    
+    まだ含まれていない項目を多く補える段落から順に選び、元の順序で連結して返す。
+    手がかりのない段落は先頭に近いものから上限まで追加する。
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    
+    chunks = split_text_chunks(text)
+    candidates = []
+    for index, chunk in enumerate(chunks):
+        fields = find_summary_fields(chunk)
+        dates = len(DATE_CUE_PATTERN.findall(chunk))
+        candidates.append((index, chunk, fields, dates, estimate_tokens(chunk) + 1))
+    
+    selected = []
+    covered = set()
+    used = 0
+    remaining = candidates
+    while remaining:
+        def gain(candidate):
+            index, _, fields, dates, _ = candidate
+            # 未収録の項目 > 日付表記 > 収録済みの項目 > 先頭に近い段落（件名・概要）の順に評価
+            # （評価が同じ場合は先頭に近い段落を優先するため、手がかりのない段落は先頭から順に残りの上限まで詰まる）
+            return (len(fields - covered) * 3 + min(dates, 3) + len(fields & covered) * 0.5
+                    + (1 if index == 0 else 0), -index)
+        best = max(remaining, key=gain)
+        remaining = [c for c in remaining if c is not best]
+        if used + best[4] > max_tokens:
+            continue
+        selected.append(best)
+        covered |= best[2]
+        used += best[4]
+    
+    selected.sort(key=lambda c: c[0])
+    return "\n".join(c[1] for c in selected)
+
+# 和暦の元年（西暦 = 元年の前年 + 和暦年）
+ERA_BASE_YEARS = {'令和': 2018, 'R': 2018, '平成': 1988, 'H': 1988, '昭和': 1925, 'S': 1925}
+# 日付（和暦・西暦）と直後の曜日・時刻（NFKC正規化後のテキストに適用）
+JAPANESE_DATE_PATTERN = re.compile(
+    r'(?:(?<![A-Za-z])(?P<era>令和|平成|昭和|R|H|S)\s*(?P<era_year>\d{1,2}|元)'
+    r'|(?P<year>(?:19|20)\d{2}))'
+    r'\s*[年./\-]\s*(?P<month>\d{1,2})\s*[月./\-]\s*(?P<day>\d{1,2})\s*日?'
+    r'(?:\s*[(（][月火水木金土日祝・]{1,3}[)）])?'
+    r'(?:\s*(?P<ampm>午前|午後)?\s*(?P<hour>\d{1,2})\s*(?:時|:)\s*(?P<minute>\d{1,2})?(?:\s*分)?)?'
+)
+# 要約項目ごとのラベル（値が日付の項目は True）
+LOCAL_FIELD_LABELS = {
+    '案件の概要': (re.compile(r'調達件名|件名|業務名|案件名|品名'), False),
+    '履行期間': (re.compile(r'履行期間|契約期間|履行期限|納入期限|納期'), True),
+    '要求元': (re.compile(r'要求元|要求部局|契約担当官等|契約担当官|支出負担行為担当官'), False),
+    '参加表明期限': (re.compile(r'参加(?:表明|意思表示|意思確認|申請)'), True),
+    '履行体制に関する資料提出期限': (re.compile(r'履行体制'), True),
+    '提案書などの提出期限': (re.compile(r'(?:技術)?提案書|企画書'), True),
+    '入札日時': (re.compile(r'入札(?:及び開札)?の?日時|開札の?日時|入札執行日時'), True),
+    '入札制限の記載': (re.compile(r'(?:入札|競争)?参加資格'), False),
+}
+BID_METHOD_PATTERN = re.compile(
+    r'一般競争入札|指名競争入札|企画競争|総合評価落札方式|公募型プロポーザル|随意契約|オープンカウンター')
+
+def parse_japanese_date(match):
+    """JAPANESE_DATE_PATTERN の一致結果を ISO形式（YYYY-MM-DD または YYYY-MM-DD HH:MM）に変換"""
+    if match.group('era'):
+        era_year = match.group('era_year')
+        year = ERA_BASE_YEARS[match.group('era')] + (1 if era_year == '元' else int(era_year))
+    else:
+        year = int(match.group('year'))
+    try:
+        value = date(year, int(match.group('month')), int(match.group('day'))).isoformat()
+    except ValueError:
+        return None
+    if match.group('hour'):
+        hour = int(match.group('hour'))
+        if match.group('ampm') == '午後' and hour < 12:
+            hour += 12
+        minute = int(match.group('minute') or 0)
+        if hour < 24 and minute < 60:
+            value += f" {hour:02d}:{minute:02d}"
+    return value
+
+def find_japanese_dates(text):
+    """テキスト中の日付（和暦・全角数字を含む）を ISO形式のリストで返す"""
+    text = unicodedata.normalize('NFKC', text)
+    dates = []
+    for match in JAPANESE_DATE_PATTERN.finditer(text):
+        value = parse_japanese_date(match)
+        if value:
+            dates.append(value)
+    return dates
+
+# APIの日付項目 → 正規化した日付を保存する列（ISO形式の文字列のため、文字列の大小で並べ替え・範囲検索できる）
+DATE_COLUMNS = {
+    'cft_issue_date': 'cft_issue_date_iso',
+    'tender_submission_deadline': 'tender_submission_deadline_iso',
+    'opening_tenders_event': 'opening_tenders_event_iso',
+    'period_end_time': 'period_end_time_iso',
+}
+# 期限として通知する日付列と表示名（通知メールの表示名と同じ）
+DEADLINE_COLUMNS = {
+    'tender_submission_deadline_iso': '入札開始日',
+    'opening_tenders_event_iso': '開札日',
+    'period_end_time_iso': '納入期限',
+}
+ISO_DATE_PATTERN = re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})(?:[T ](\d{1,2}):(\d{2}))?')
+
+def normalize_date(value):
+    """APIの日付（ISO形式・和暦など）を ISO形式（YYYY-MM-DD または YYYY-MM-DD HH:MM）に変換（変換できない場合は None）"""
+    if not value:
+        return None
+    match = ISO_DATE_PATTERN.match(unicodedata.normalize('NFKC', str(value)).strip())
+    if not match:
+        dates = find_japanese_dates(str(value))
+        return dates[0] if dates else None
+    year, month, day, hour, minute = match.groups()
+    try:
+        normalized = date(int(year), int(month), int(day)).isoformat()
+    except ValueError:
+        return None
+    # 時刻が 00:00 の場合は日付のみとみなす
+    if hour is not None and (int(hour), int(minute)) != (0, 0) and int(hour) < 24:
+        normalized += f" {int(hour):02d}:{minute}"
+    return normalized
+
+def extract_summary_fields(text):
+    """PDFテキストから要約項目を正規表現で抽出し、{項目: 値} を返す（抽出できた項目のみ）"""
+    text = unicodedata.normalize('NFKC', text)
+    fields = {}
+    
+    for field, (label, is_date) in LOCAL_FIELD_LABELS.items():
+        for match in label.finditer(text):
+            after = text[match.end():match.end() + 200]
+            if is_date:
+                # ラベル以降3行以内で最初に日付が現れる行から値を取る
+                dates = []
+                for line in after.split('\n')[:3]:
+                    dates = [d for d in map(parse_japanese_date, JAPANESE_DATE_PATTERN.finditer(line)) if d]
+                    if dates:
+                        break
+                if not dates:
+                    continue
+                if field != '履行期間':
+                    value = dates[0]
+                elif len(dates) >= 2:
+                    value = f"{dates[0]}〜{dates[1]}"
+                elif '契約締結' in line:
+                    value = f"契約締結日〜{dates[0]}"
+                else:
+                    value = f"〜{dates[0]}"
+            else:
+                # ラベルと同じ行の残り（空の場合は次の行）を値とする
+                lines = [line.strip(' 　:：・.') for line in after.split('\n')]
+                value = next((line for line in lines[:2] if line), '')[:100]
+                if not value:
+                    continue
+            fields[field] = value
+            break
+    
+    methods = list(dict.fromkeys(BID_METHOD_PATTERN.findall(text)))
+    if methods:
+        fields['入札方式'] = '、'.join(methods)
+    return fields
+
+def format_local_summary(fields):
+    """ローカル抽出した項目を要約と同じ形式（項目：値）で整形"""
+    return "\n".join(f"{field}：{fields.get(field, '記載なし')}" for field in SUMMARY_FIELD_CUES)
+
+# Batch API のバッチがこれ以上変化しない状態
+BATCH_FINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+# 要約が完了していない案件の表示（要約は --enrich で後から生成される）
+SUMMARY_PENDING = "（要約未完了 - 要約の生成が完了していないため省略しました）"
+
+def init_extract_worker(max_memory_mb):
+    """PDFテキスト抽出プロセスの初期化（メモリ使用量の上限を設定）"""
+    if resource is not None and max_memory_mb > 0:
+        limit = max_memory_mb * 1024 * 1024
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+def extract_pdf_text_worker(pdf_path, max_pages, max_chars, cpu_seconds):
+    """PDFファイルからテキストを抽出し、(テキスト, 処理ページ数, 総ページ数) を返す（別プロセスで実行）
+    
+    最大ページ数に達するか、必要な文字数が集まるか、
+    要約する全項目の手がかり語が見つかった時点で打ち切る。
+    """
+    if resource is not None:
+        # このPDFの処理に使えるCPU時間を制限（超過するとプロセスが終了する）
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        soft = int(usage.ru_utime + usage.ru_stime) + cpu_seconds
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+    
+    # pypdf は抽出プロセスでのみ読み込む（起動時間の短縮）
+    from pypdf import PdfReader
+    pdf_reader = PdfReader(pdf_path)
+    total_pages = len(pdf_reader.pages)
+    parts = []
+    collected = 0
+    pages_read = 0
+    covered = set()
+    for page in pdf_reader.pages[:max_pages]:
+        pages_read += 1
+        page_text = page.extract_text()
+        if page_text:
+            parts.append(page_text)
+            collected += len(page_text) + 1
+            covered |= find_summary_fields(page_text)
+        if collected >= max_chars or len(covered) == len(SUMMARY_FIELD_CUES):
+            break
+    return "\n".join(parts) + ("\n" if parts else ""), pages_read, total_pages
+
+class DocumentCache:
+    """URL → 内容ハッシュ → 抽出テキスト → 要約 の永続キャッシュ（スレッドセーフ）"""
+    def __init__(self, cache_config=None):
+        cache_config = cache_config or {}
+        path = cache_config.get('path', 'kkj_cache.db') if cache_config.get('enabled', True) else ':memory:'
+        self.revalidate_after = float(cache_config.get('revalidate_after_hours', 24)) * 3600
+        self.max_age = float(cache_config.get('max_age_days', 90)) * 86400
+        self.max_bytes = int(float(cache_config.get('max_size_mb', 100)) * 1024 * 1024)
+        self.stats = {}
+        self.lock = threading.Lock()
+        
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS documents (
+                    url TEXT PRIMARY KEY,
+                    content_hash TEXT,
+                    content_type TEXT,
+                    etag TEXT,
+                    last_modified TEXT,
+                    fetched_at REAL,
+                    accessed_at REAL
+                )
+            ''')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS texts (
+                    content_hash TEXT PRIMARY KEY,
+                    text TEXT,
+                    size INTEGER,
+                    created_at REAL,
+                    accessed_at REAL
+                )
+            ''')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS summaries (
+                    content_hash TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    prompt_version INTEGER NOT NULL,
+                    summary TEXT,
+                    size INTEGER,
+                    created_at REAL,
+                    accessed_at REAL,
+                    PRIMARY KEY (content_hash, model, prompt_version)
+                )
+            ''')
+    
+    def record(self, kind, hit):
+        """ヒット・ミスを集計"""
+        with self.lock:
+            counts = self.stats.setdefault(kind, [0, 0])
+            counts[0 if hit else 1] += 1
+    
+    def get_document(self, url):
+        """URLのキャッシュ情報を取得"""
+        with self.lock:
+            row = self.conn.execute('''
+                SELECT content_hash, content_type, etag, last_modified, fetched_at
+                FROM documents WHERE url = ?
+            ''', (url,)).fetchone()
+            if row is None:
+                return None
+            with self.conn:
+                self.conn.execute("UPDATE documents SET accessed_at = ? WHERE url = ?", (time.time(), url))
+        return dict(zip(('content_hash', 'content_type', 'etag', 'last_modified', 'fetched_at'), row))
+    
+    def put_document(self, url, content_hash, content_type, etag=None, last_modified=None):
+        """URLの取得結果を記録"""
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute('''
+                INSERT OR REPLACE INTO documents
+                    (url, content_hash, content_type, etag, last_modified, fetched_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (url, content_hash, content_type, etag, last_modified, now, now))
+    
+    def touch_document(self, url):
+        """再検証で変更がなかったURLの取得日時を更新"""
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE documents SET fetched_at = ? WHERE url = ?", (time.time(), url))
+    
+    def get_text(self, content_hash):
+        """内容ハッシュに対応する抽出テキストを取得"""
+        with self.lock:
+            row = self.conn.execute("SELECT text FROM texts WHERE content_hash = ?", (content_hash,)).fetchone()
+            if row is not None:
+                with self.conn:
+                    self.conn.execute("UPDATE texts SET accessed_at = ? WHERE content_hash = ?",
+                                      (time.time(), content_hash))
+        self.record('text', row is not None)
+        return row[0] if row else None
+    
+    def has_text(self, content_hash):
+        """内容ハッシュに対応する抽出テキストがあるか（ヒット率には含めない）"""
+        with self.lock:
+            row = self.conn.execute("SELECT 1 FROM texts WHERE content_hash = ?", (content_hash,)).fetchone()
+        return row is not None
+    
+    def put_text(self, content_hash, text):
+        """抽出テキストを記録"""
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute('''
+                INSERT OR REPLACE INTO texts (content_hash, text, size, created_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (content_hash, text, len(text.encode('utf-8')), now, now))
+    
+    def get_summary(self, content_hash, model, prompt_version):
+        """内容ハッシュ・モデル・プロンプト版に対応する要約を取得"""
+        with self.lock:
+            row = self.conn.execute('''
+                SELECT summary FROM summaries
+                WHERE content_hash = ? AND model = ? AND prompt_version = ?
+            ''', (content_hash, model, prompt_version)).fetchone()
+            if row is not None:
+                with self.conn:
+                    self.conn.execute('''
+                        UPDATE summaries SET accessed_at = ?
+                        WHERE content_hash = ? AND model = ? AND prompt_version = ?
+                    ''', (time.time(), content_hash, model, prompt_version))
+        self.record('summary', row is not None)
+        return row[0] if row else None
+    
+    def put_summary(self, content_hash, model, prompt_version, summary):
+        """要約を記録"""
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute('''
+                INSERT OR REPLACE INTO summaries
+                    (content_hash, model, prompt_version, summary, size, created_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (content_hash, model, prompt_version, summary, len(summary.encode('utf-8')), now, now))
+    
+    def evict(self):
+        """期限切れ・容量超過のエントリを古い順に削除"""
+        expire = time.time() - self.max_age
+        with self.lock, self.conn:
+            removed = 0
+            for table in ('documents', 'texts', 'summaries'):
+                removed += self.conn.execute(f"DELETE FROM {table} WHERE accessed_at < ?", (expire,)).rowcount
+            
+            # 容量超過分は最終参照日時の古いテキストから削除（対応する要約も削除）
+            total = self.conn.execute(
+                "SELECT COALESCE((SELECT SUM(size) FROM texts), 0) + COALESCE((SELECT SUM(size) FROM summaries), 0)"
+            ).fetchone()[0]
+            if total > self.max_bytes:
+                cursor = self.conn.execute("SELECT content_hash, size FROM texts ORDER BY accessed_at")
+                victims = []
+                for content_hash, size in cursor:
+                    if total <= self.max_bytes:
+                        break
+                    victims.append((content_hash,))
+                    total -= size or 0
+                self.conn.executemany("DELETE FROM texts WHERE content_hash = ?", victims)
+                self.conn.executemany("DELETE FROM summaries WHERE content_hash = ?", victims)
+                removed += len(victims)
+        if removed:
+            logger.info(f"キャッシュから {removed} 件のエントリを削除しました")
+    
+    def log_stats(self):
+        """キャッシュのヒット率をログに出力"""
+        labels = {'document': '文書', 'text': '抽出テキスト', 'summary': '要約'}
+        for kind, (hits, misses) in self.stats.items():
+            total = hits + misses
+            if total:
+                logger.info(f"キャッシュ統計: {labels.get(kind, kind)} ヒット {hits}/{total} 件 "
+                            f"({hits / total * 100:.1f}%)")
+    
+    def close(self):
+        """キャッシュを閉じる"""
+        self.conn.close()
+
+class KeywordMatcher:
+    """Aho-Corasick法で複数キーワードを1回の走査で照合する"""
+    def __init__(self, keywords):
+        self.keywords = list(dict.fromkeys(k for k in keywords if k))
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [set()]
+        
+        # キーワードのトライ木を構築
+        for keyword in self.keywords:
+            node = 0
+            for ch in self.normalize(keyword):
+                next_node = self.goto[node].get(ch)
+                if next_node is None:
+                    next_node = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(set())
+                    self.goto[node][ch] = next_node
+                node = next_node
+            if node:
+                self.output[node].add(keyword)
+        
+        # 幅優先で失敗遷移を設定
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, next_node in self.goto[node].items():
+                queue.append(next_node)
+                fail = self.fail[node]
+                while fail and ch not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[next_node] = self.goto[fail].get(ch, 0)
+                self.output[next_node] |= self.output[self.fail[next_node]]
+    
+    @staticmethod
+    def normalize(text):
+        """全角・半角と大文字・小文字の違いを吸収"""
+        return unicodedata.normalize('NFKC', text).casefold()
+    
+    def find(self, text):
+        """テキストに含まれるキーワードを設定順で返す"""
+        found = set()
+        node = 0
+        for ch in self.normalize(text or ''):
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+            if self.output[node]:
+                found |= self.output[node]
+        return [keyword for keyword in self.keywords if keyword in found]
+
+class CronSchedule:
+    """cron形式（分 時 日 月 曜日）の実行スケジュール"""
+    FIELD_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+    
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"スケジュールは「分 時 日 月 曜日」の5項目で指定してください: '{expression}'")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            self.parse_field(field, low, high) for field, (low, high) in zip(fields, self.FIELD_RANGES))
+        # 0と7はどちらも日曜日
+        self.weekdays = {weekday % 7 for weekday in weekdays}
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+    
+    @staticmethod
+    def parse_field(field, low, high):
+        """1項目（*, 値, 範囲, リスト, ステップ）を値の集合に変換"""
+        values = set()
+        for part in field.split(','):
+            base, _, step = part.partition('/')
+            try:
+                if base == '*':
+                    start, end = low, high
+                elif '-' in base:
+                    start, end = (int(value) for value in base.split('-', 1))
+                else:
+                    start = int(base)
+                    end = high if step else start
+                step = int(step) if step else 1
+            except ValueError:
+                raise ValueError(f"スケジュールの値が不正です: '{field}'") from None
+            if start < low or end > high or start > end or step < 1:
+                raise ValueError(f"スケジュールの値が範囲外です: '{field}' ({low}-{high})")
+            values.update(range(start, end + 1, step))
+        return values
+    
+    def matches(self, moment):
+        """指定した日時（分単位）が実行対象か判定"""
+        if (moment.minute not in self.minutes or moment.hour not in self.hours
+                or moment.month not in self.months):
+            return False
+        day = moment.day in self.days
+        weekday = moment.isoweekday() % 7 in self.weekdays
+        # 日と曜日の両方を指定した場合はいずれかに一致すれば実行する（cronと同じ）
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+class TokenBucket:
+    """トークンバケット方式のレート制限（スレッドセーフ）"""
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = max(1, int(capacity))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """トークンを1つ取得（不足している場合は補充されるまで待機）"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class HTTPClient:
+    """接続プール・圧縮・リトライ付きの共有HTTPクライアント"""
+    RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+    
+    def __init__(self, http_config=None, pool_maxsize=10):
+        http_config = http_config or {}
+        self.retries = max(0, int(http_config.get('retries', 3)))
+        self.backoff_factor = float(http_config.get('backoff_factor', 0.5))
+        self.backoff_max = float(http_config.get('backoff_max', 30))
+        
+        # 接続・読み取りタイムアウト（ホスト単位で上書き可能）
+        timeout = http_config.get('timeout', {})
+        self.default_timeout = (timeout.get('connect', 10), timeout.get('read', 30))
+        self.host_timeouts = {}
+        for host, host_timeout in http_config.get('hosts', {}).items():
+            self.host_timeouts[host] = (host_timeout.get('connect', self.default_timeout[0]),
+                                        host_timeout.get('read', self.default_timeout[1]))
+        
+        # ホストごとに接続をプールしてKeep-Aliveで再利用する
+        pool_maxsize = max(pool_maxsize, int(http_config.get('pool_maxsize', 10)))
+        adapter = HTTPAdapter(pool_connections=int(http_config.get('pool_connections', 10)),
+                              pool_maxsize=pool_maxsize, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            'Accept-Encoding': 'gzip, deflate',
+            'User-Agent': http_config.get('user_agent', 'kkj_search/1.0'),
+        })
+        self.retry_count = 0
+        self.lock = threading.Lock()
+    
+    def get_timeout(self, url):
+        """URLのホストに対応するタイムアウト (接続, 読み取り) を取得"""
+        return self.host_timeouts.get(urlparse(url).hostname, self.default_timeout)
+    
+    def get_backoff(self, attempt, response=None):
+        """リトライまでの待機秒数（指数バックオフ + ジッター）"""
+        if response is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                return min(self.backoff_max, float(retry_after))
+        backoff = min(self.backoff_max, self.backoff_factor * (2 ** attempt))
+        return random.uniform(0, backoff)
+    
+    def get(self, url, rate_limiter=None, **kwargs):
+        """GETリクエストを実行（一時的なエラーはリトライ）"""
+        kwargs.setdefault('timeout', self.get_timeout(url))
+        attempt = 0
+        while True:
+            if rate_limiter:
+                rate_limiter.acquire()
+            response = None
+            try:
+                response = self.session.get(url, **kwargs)
+                if response.status_code not in self.RETRY_STATUS_CODES or attempt >= self.retries:
+                    return response
+                reason = f"ステータスコード {response.status_code}"
+                response.close()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt >= self.retries:
+                    raise
+                reason = f"{type(e).__name__}"
+            
+            wait = self.get_backoff(attempt, response)
+            attempt += 1
+            with self.lock:
+                self.retry_count += 1
+            logger.warning(f"HTTPリトライ ({attempt}/{self.retries}): {reason} - {wait:.1f}秒後に再試行します: {url}")
+            time.sleep(wait)
+    
+    def get_stats(self):
+        """ホストごとの接続数・リクエスト数（接続の再利用状況）を取得"""
+        stats = {}
+        for adapter in set(self.session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for pool_key in list(pools.keys()):
+                pool = pools.get(pool_key)
+                if pool is None:
+                    continue
+                host = stats.setdefault(pool.host, {'connections': 0, 'requests': 0})
+                host['connections'] += pool.num_connections
+                host['requests'] += pool.num_requests
+        return stats
+    
+    def log_stats(self):
+        """接続の再利用状況をログに出力"""
+        for host, stats in self.get_stats().items():
+            reused = max(0, stats['requests'] - stats['connections'])
+            logger.info(f"HTTP接続統計: {host} リクエスト {stats['requests']} 件, "
+                        f"新規接続 {stats['connections']} 件, 接続再利用 {reused} 件")
+        if self.retry_count:
+            logger.info(f"HTTPリトライ回数: {self.retry_count} 回")
+    
+    def close(self):
+        """セッションを閉じる"""
+        self.session.close()
+
 class KKJSearchNotifier:
+    # 一括取得（キーワード指定なし）の取得位置を記録する際のキーワード
+    BROAD_QUERY = '*'
+    
     def __init__(self, config_file='config.json'):
         """初期化"""
         self.config = self.load_config(config_file)
         self.api_url = "http://www.kkj.go.jp/api/"
         self.db_path = self.config['database']['path']
+        # API負荷対策: 全スレッドで共有するレート制限
+        fetch_config = self.config.get('fetch', {})
+        self.rate_limiter = TokenBucket(fetch_config.get('requests_per_second', 1.0),
+                                        fetch_config.get('burst', 1))
+        # 1ページあたりの取得件数（APIの上限は1000件）
+        self.page_size = min(1000, max(1, int(fetch_config.get('page_size', 100))))
+        self.http = HTTPClient(self.config.get('http', {}),
+                               pool_maxsize=int(fetch_config.get('max_workers', 1)))
         self.openai_api_key = self.config.get('openai', {}).get('api_key')
         self.openai_model = self.config.get('openai', {}).get('model', 'gpt-4o')
+        # 互換APIやローカルのモックサーバーを使う場合の接続先（省略時は公式API）
+        self.openai_base_url = self.config.get('openai', {}).get('base_url') or None
+        # OpenAIクライアントは要約を行う時に作成する（get_openai_client）
         self.openai_client = None
-        if self.openai_api_key:
-            try:
-                self.openai_client = openai.OpenAI(api_key=self.openai_api_key)
-                logger.info("OpenAIクライアントを正常に初期化しました")
-            except Exception as e:
-                logger.error(f"OpenAIクライアント初期化エラー: {e}")
-                logger.warning("OpenAI要約機能は無効化されます")
+        self.openai_disabled = False
+        self.openai_lock = threading.Lock()
+        self.conn = None
+        self.cache = None
+        self.summary_executor = None
+        self.extract_pool = None
+        self.extract_lock = threading.Lock()
+        self.extraction_stats = {'documents': 0, 'llm_skipped': 0, 'llm_calls': 0, 'llm_seconds': 0.0, 'fields': {}}
+        self.full_sync = False
+        self.lock_file = None
+        self.stop_event = threading.Event()
+        # 今回の実行の開始時点で登録済みの案件の最大 id（search_pages の打ち切り判定に使用）
+        self.known_max_id = 0
         self.init_database()
         
     def load_config(self, config_file):
@@ -81,9 +928,45 @@ class KKJSearchNotifier:
         with open(config_file, 'r', encoding='utf-8') as f:
             return json.load(f)
     
+    def get_connection(self):
+        """実行中に使い回すデータベース接続を取得"""
+        if self.conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            # 登録時・既存データの移行時に日付を正規化する関数
+            conn.create_function('normalize_date', 1, normalize_date, deterministic=True)
+            # 新規作成するデータベースは削除後の空きページを kkj_maintenance.py --vacuum で少しずつ解放できるようにする
+            # （既存のデータベースでは効果がなく、kkj_maintenance.py --vacuum の初回に変換される）
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            # WALモード: 書き込み中も他プロセス（メンテナンス・統計表示）の読み取りをブロックしない
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn = conn
+        return self.conn
+    
+    def close(self):
+        """データベース接続とHTTPセッションを閉じる"""
+        if self.summary_executor is not None:
+            # 制限時間後も処理中の要約を待ってからキャッシュを閉じる（結果は次回以降に再利用）
+            self.summary_executor.shutdown(wait=True, cancel_futures=True)
+            self.summary_executor = None
+        if self.extract_pool is not None:
+            self.extract_pool.shutdown(wait=True, cancel_futures=True)
+            self.extract_pool = None
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        if self.cache is not None:
+            self.cache.evict()
+            self.cache.close()
+            self.cache = None
+        self.http.close()
+        if self.lock_file is not None:
+            self.lock_file.close()
+            self.lock_file = None
+    
     def init_database(self):
         """データベースの初期化"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.get_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -104,232 +987,1338 @@ class KKJSearchNotifier:
                 file_size INTEGER,
                 search_keyword TEXT,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                notified BOOLEAN DEFAULT 0
+                notified BOOLEAN DEFAULT 0,
+                cft_issue_date_iso TEXT,
+                tender_submission_deadline_iso TEXT,
+                opening_tenders_event_iso TEXT,
+                period_end_time_iso TEXT
+            )
+        ''')
+        
+        # 日付の正規化列（既存のデータベースには列を追加して正規化済みの値を設定）
+        for column, iso_column in DATE_COLUMNS.items():
+            if self.add_column_if_missing('search_results', iso_column, 'TEXT'):
+                cursor.execute(f"UPDATE search_results SET {iso_column} = normalize_date({column}) "
+                               f"WHERE {column} IS NOT NULL")
+                logger.info(f"{iso_column} を {cursor.rowcount} 件設定しました")
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_search_results_{iso_column} "
+                           f"ON search_results ({iso_column})")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_search_results_created_at ON search_results (created_at)")
+        
+        # 未通知の案件のみを対象とする部分インデックス（通知済みの案件数に依存しない）
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_search_results_unnotified ON search_results (created_at) WHERE notified = 0")
+        
+        # 機関名・キーワードごとの取得済み最新公告日（差分取得用）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS fetch_state (
+                organization TEXT NOT NULL,
+                keyword TEXT NOT NULL,
+                last_issue_date TEXT,
+                last_key TEXT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                resume_before TEXT,
+                crawl_latest TEXT,
+                PRIMARY KEY (organization, keyword)
+            )
+        ''')
+        # 途中で終了した取得の続きを再開する位置（resume_before）と、その取得で見つかった最新公告日（crawl_latest）
+        self.add_column_if_missing('fetch_state', 'resume_before', 'TEXT')
+        self.add_column_if_missing('fetch_state', 'crawl_latest', 'TEXT')
+        
+        # 案件ごとに一致した全キーワード
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS keyword_hits (
+                key TEXT NOT NULL,
+                keyword TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (key, keyword)
             )
         ''')
         
+        # 要約の保存と生成キュー（state: pending / running / batched / done / failed）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS enrichment (
+                key TEXT PRIMARY KEY,
+                url TEXT,
+                state TEXT NOT NULL DEFAULT 'pending',
+                summary TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                batch_id TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        self.add_column_if_missing('enrichment', 'batch_id', 'TEXT')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_enrichment_state ON enrichment (state, created_at)")
+        
+        # OpenAI Batch API に投入した要約バッチ
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS summary_batches (
+                batch_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                input_file_id TEXT,
+                output_file_id TEXT,
+                error_file_id TEXT,
+                request_count INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # 送信待ちの通知メール（state: pending / sent / failed）
+        outbox_exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'outbox'").fetchone()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                profile TEXT,
+                subject TEXT,
+                message TEXT NOT NULL,
+                item_keys TEXT NOT NULL DEFAULT '[]',
+                state TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                sent_at TIMESTAMP
+            )
+        ''')
+        # 送信中（sending）のメールも送信期限を過ぎた場合は再送の対象になるため索引に含める
+        cursor.execute("DROP INDEX IF EXISTS idx_outbox_pending")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (next_attempt_at) "
+                       "WHERE state IN ('pending', 'sending')")
+        if not outbox_exists:
+            # 送信待ちの管理を始める前の案件は従来の方法で通知済みとみなす
+            cursor.execute("UPDATE search_results SET notified = 1 WHERE notified = 0")
+            if cursor.rowcount:
+                logger.info(f"既存の案件 {cursor.rowcount} 件を通知済みに設定しました")
+        
+        self.init_search_index(cursor)
+        
+        # 日 × キーワード × カテゴリ × 機関ごとの新規案件数（登録時に更新し、kkj_maintenance.py --stats で使用）
+        # 案件をアーカイブ・削除しても集計は残る
+        stats_exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'daily_stats'").fetchone()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS daily_stats (
+                day TEXT NOT NULL,
+                keyword TEXT NOT NULL,
+                category TEXT NOT NULL,
+                organization_name TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, keyword, category, organization_name)
+            )
+        ''')
+        if not stats_exists:
+            # 集計テーブルの作成前に保存された案件を集計
+            cursor.execute('''
+                INSERT INTO daily_stats (day, keyword, category, organization_name, count)
+                SELECT date(created_at), COALESCE(search_keyword, ''), COALESCE(category, ''),
+                       COALESCE(organization_name, ''), COUNT(*)
+                FROM search_results GROUP BY 1, 2, 3, 4
+            ''')
+            if cursor.rowcount > 0:
+                logger.info(f"既存の案件から集計を {cursor.rowcount} 行作成しました")
+        
+        # 一括登録用の一時テーブル（接続ごと）
+        cursor.execute(f"""
+            CREATE TEMP TABLE IF NOT EXISTS ingest (
+                {', '.join(SearchRecord.__slots__)}
+            )
+        """)
+        
         conn.commit()
-        conn.close()
         logger.info("データベースを初期化しました")
     
-    def search_api(self, keyword):
-        """APIで検索を実行"""
+    def init_search_index(self, cursor):
+        """保存済み案件の全文検索インデックス（FTS5・trigram）を作成し、トリガーで同期する
+        
+        trigram は文字の3-gramで索引を作るため、分かち書きなしで日本語の部分一致検索ができる。
+        FTS5 を利用できない SQLite の場合は作成せず、検索は LIKE で行う。
+        """
+        index_exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_index'").fetchone()
+        try:
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+                    key UNINDEXED, project_name, location, organization_name, summary,
+                    tokenize = 'trigram'
+                )
+            ''')
+        except sqlite3.OperationalError as e:
+            logger.warning(f"全文検索インデックスを作成できません（LIKE検索を使用します）: {e}")
+            return
+        
+        # search_results の rowid（id）を索引の rowid として同期する
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS search_index_insert AFTER INSERT ON search_results BEGIN
+                INSERT INTO search_index (rowid, key, project_name, location, organization_name, summary)
+                VALUES (new.id, new.key, new.project_name, new.location, new.organization_name,
+                        (SELECT summary FROM enrichment WHERE key = new.key));
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS search_index_delete AFTER DELETE ON search_results BEGIN
+                DELETE FROM search_index WHERE rowid = old.id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS search_index_update
+            AFTER UPDATE OF project_name, location, organization_name ON search_results BEGIN
+                UPDATE search_index SET project_name = new.project_name, location = new.location,
+                    organization_name = new.organization_name
+                WHERE rowid = new.id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS search_index_summary AFTER UPDATE OF summary ON enrichment BEGIN
+                UPDATE search_index SET summary = new.summary
+                WHERE rowid = (SELECT id FROM search_results WHERE key = new.key);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS search_index_summary_delete AFTER DELETE ON enrichment BEGIN
+                UPDATE search_index SET summary = NULL
+                WHERE rowid = (SELECT id FROM search_results WHERE key = old.key);
+            END
+        ''')
+        
+        if not index_exists:
+            # 索引の作成前に保存された案件を登録
+            cursor.execute('''
+                INSERT INTO search_index (rowid, key, project_name, location, organization_name, summary)
+                SELECT r.id, r.key, r.project_name, r.location, r.organization_name, e.summary
+                FROM search_results r LEFT JOIN enrichment e ON e.key = r.key
+            ''')
+            if cursor.rowcount:
+                logger.info(f"全文検索インデックスに既存の案件 {cursor.rowcount} 件を登録しました")
+    
+    def search_local(self, query, limit=20):
+        """保存済みの案件を全文検索し、関連度の高い順に返す
+        
+        空白区切りの語をすべて含む案件を検索する。trigram で検索できない2文字以下の語は
+        LIKE で絞り込む（1〜2文字の語のみの場合は索引を使わずに検索する）。
+        """
+        terms = query.split()
+        if not terms:
+            return []
+        conn = self.get_connection()
+        has_index = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_index'").fetchone()
+        source = 'search_index' if has_index else '''(
+            SELECT r.id AS rowid, r.key, r.project_name, r.location, r.organization_name, e.summary
+            FROM search_results r LEFT JOIN enrichment e ON e.key = r.key)'''
+        
+        conditions = []
+        params = []
+        fts_terms = [term for term in terms if len(term) >= 3] if has_index else []
+        if fts_terms:
+            # 各語をフレーズとして指定（" は2つ重ねてエスケープ）
+            conditions.append("search_index MATCH ?")
+            params.append(' '.join('"' + term.replace('"', '""') + '"' for term in fts_terms))
+        for term in terms:
+            if term in fts_terms:
+                continue
+            pattern = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            conditions.append("(" + " OR ".join(
+                f"s.{column} LIKE ? ESCAPE '\\'" for column in ('project_name', 'location', 'organization_name', 'summary')) + ")")
+            params.extend([pattern] * 4)
+        
+        # 件名の一致を最も重視する（bm25 は値が小さいほど関連度が高い）
+        order = "bm25(search_index, 0, 10.0, 1.0, 2.0, 1.0)" if fts_terms else "r.cft_issue_date DESC"
+        rows = conn.execute(f'''
+            SELECT r.key, r.project_name, r.organization_name, r.cft_issue_date, r.location,
+                   r.external_document_uri, s.summary
+            FROM {source} s JOIN search_results r ON r.id = s.rowid
+            WHERE {' AND '.join(conditions)}
+            ORDER BY {order}, r.cft_issue_date DESC
+            LIMIT ?
+        ''', params + [limit]).fetchall()
+        columns = ('key', 'project_name', 'organization_name', 'cft_issue_date', 'location',
+                   'external_document_uri', 'summary')
+        return [dict(zip(columns, row)) for row in rows]
+    
+    def search_archive(self, query, limit=20, exclude_keys=()):
+        """アーカイブした案件を検索し、公告日の新しい順に返す（search_local と同じ形式）
+        
+        空白区切りの語をすべて（大文字・小文字を区別せず）含む案件を、アーカイブを順に読み込んで検索する。
+        検索語を含まない行はJSONとして解析せずに読み飛ばす。
+        同じ案件が複数回アーカイブされている場合は最後のものを使い、exclude_keys の案件は除く。
+        """
+        terms = [term.lower() for term in query.split()]
+        if not terms:
+            return []
+        # エスケープされる文字を含む検索語は行の文字列では判定できないため、すべての行を解析する
+        prefilter = not any('"' in term or '\\' in term for term in terms)
+        archive_dir = self.config.get('database', {}).get('archive_path', 'archive')
+        matches = {}
+        for line in iter_archive_lines(archive_dir):
+            lowered = line.lower()
+            if prefilter and not all(term in lowered for term in terms):
+                # 後からアーカイブされた同じ案件が一致しない場合は、以前の一致を取り消す
+                if matches:
+                    key = ARCHIVE_KEY_PATTERN.search(line)
+                    if key:
+                        matches.pop(json.loads(f'"{key.group(1)}"'), None)
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                logger.error(f"アーカイブの行を読み込めません（スキップします）: {str(e)}")
+                continue
+            text = ' '.join(record.get(column) or '' for column in
+                            ('project_name', 'location', 'organization_name', 'summary')).lower()
+            if all(term in text for term in terms):
+                matches[record['key']] = record
+            else:
+                matches.pop(record['key'], None)
+        
+        columns = ('key', 'project_name', 'organization_name', 'cft_issue_date', 'location',
+                   'external_document_uri', 'summary')
+        results = [{column: record.get(column) for column in columns}
+                   for key, record in matches.items() if key not in exclude_keys]
+        results.sort(key=lambda r: r['cft_issue_date'] or '', reverse=True)
+        return results[:limit]
+    
+    def get_upcoming_deadlines(self, days):
+        """今日から days 日後までに期限（入札開始日・開札日・納入期限）を迎える案件を期限の早い順に返す
+        
+        正規化した日付列ごとのインデックスの範囲検索を UNION ALL でまとめる（日付文字列の解析は行わない）。
+        """
+        start = date.today().isoformat()
+        end = (date.today() + timedelta(days=days + 1)).isoformat()
+        queries = [f'''
+            SELECT {column} AS due, '{label}' AS kind, key, project_name, organization_name, location,
+                   external_document_uri, search_keyword
+            FROM search_results WHERE {column} >= ? AND {column} < ?'''
+            for column, label in DEADLINE_COLUMNS.items()]
+        rows = self.get_connection().execute(
+            ' UNION ALL '.join(queries) + ' ORDER BY due, key',
+            [start, end] * len(DEADLINE_COLUMNS)).fetchall()
+        columns = ('due', 'kind', 'key', 'project_name', 'organization_name', 'location', 'external_document_uri',
+                   'search_keyword')
+        return [dict(zip(columns, row)) for row in rows]
+    
+    def add_column_if_missing(self, table, column, definition):
+        """既存のデータベースに不足している列を追加（追加した場合は True）"""
+        conn = self.get_connection()
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if column in columns:
+            return False
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        logger.info(f"{table} テーブルに {column} 列を追加しました")
+        return True
+    
+    def search_api(self, organization, keyword, cft_issue_date=None):
+        """APIで検索を実行（1ページ分）し、ストリーミング中のレスポンスを返す"""
         params = {
-            'Organization_Name': self.config['organization'],
-            'Project_Name': keyword,  # 件名での検索に変更
-            'Count': 100  # 最大100件取得
+            'Organization_Name': organization,
+            'Count': self.page_size
+        }
+        if keyword:
+            params['Project_Name'] = keyword  # 件名での検索に変更
+        if cft_issue_date:
+            # 公告日の期間指定（YYYY-MM-DD/YYYY-MM-DD 形式、片側省略可）
+            params['CFT_Issue_Date'] = cft_issue_date
+        
+        try:
+            logger.info(f"検索実行: 機関名={organization}"
+                        + (f", 件名キーワード={keyword}" if keyword else " (キーワード指定なし)")
+                        + (f", 公告日={cft_issue_date}" if cft_issue_date else ""))
+            response = self.http.get(self.api_url, params=params, rate_limiter=self.rate_limiter,
+                                     stream=True)
+            
+            if response.status_code != 200:
+                logger.error(f"APIエラー: ステータスコード {response.status_code}")
+                response.close()
+                return None
+            
+            # 本文は文字列に展開せず、圧縮を解除しながら逐次読み込む
+            response.raw.decode_content = True
+            return response
+            
+        except requests.exceptions.RequestException as e:
+            logger.error(f"API通信エラー: {str(e)}")
+            return None
+    
+    def search_pages(self, organization, keyword, since=None, until=None, stop_at_known=False):
+        """件数上限を超える検索結果をページ単位で取得するイテレータ
+        
+        APIには開始位置の指定がないため、取得済みページの最も古い公告日を
+        次ページの公告日の上限として期間を狭めながら遡る。
+        stop_at_known を指定した場合は、今回の実行より前に登録済みの案件のみのページに達した時点で
+        取得済みとみなして終了する（前回までの取得が完了している場合のみ指定する）。
+        since を指定した場合はその公告日以降、until を指定した場合はその公告日以前の案件のみを取得する。
+        取得に失敗した場合や、未取得の案件を残して打ち切った場合（ページ数の上限・同一公告日の案件が
+        1ページの件数を超える場合）は None を返して終了する（取得位置を進めないため）。
+        """
+        max_pages = max(1, int(self.config.get('fetch', {}).get('max_pages', 10)))
+        seen_keys = set()
+        since = since or ''
+        if until:
+            cft_issue_date = f"{since}/{until}"
+        else:
+            cft_issue_date = f"{since}/" if since else None
+        
+        for page in range(1, max_pages + 1):
+            response = self.search_api(organization, keyword, cft_issue_date)
+            if response is None:
+                yield None
+                return
+            try:
+                search_hits, results = self.parse_xml_page(response.raw, keyword)
+            except (requests.exceptions.RequestException, Urllib3HTTPError, OSError) as e:
+                # 本文をストリームから直接読み込むため、受信途中のタイムアウト・切断・伸長エラーは
+                # urllib3 の例外として送出される
+                logger.error(f"API通信エラー: {type(e).__name__} - {str(e)}")
+                yield None
+                return
+            finally:
+                response.close()
+            
+            # 前ページと重複する案件（同日公告分）を除外
+            page_results = [r for r in results if r['key'] not in seen_keys]
+            seen_keys.update(r['key'] for r in results)
+            if page_results:
+                yield page_results
+            
+            # 全件取得済み
+            if search_hits is None or search_hits <= len(results):
+                return
+            if page >= max_pages:
+                logger.warning(f"ページ数の上限に達したため取得を打ち切ります: キーワード '{keyword}' "
+                               f"({max_pages} ページ, ヒット数 {search_hits})")
+                yield None
+                return
+            
+            # 既知の案件のみのページであれば以降も取得済みとみなす
+            known_keys = self.find_known_keys([r['key'] for r in page_results]) if stop_at_known else set()
+            if stop_at_known and len(known_keys) == len(page_results):
+                logger.info(f"登録済みの案件に到達したため取得を終了します: キーワード '{keyword}' ({page} ページ)")
+                return
+            
+            # 次ページ: このページで最も古い公告日以前に期間を絞る
+            issue_dates = [r['cft_issue_date'][:10] for r in results if r['cft_issue_date']]
+            if not issue_dates:
+                logger.warning(f"公告日のない案件のみのため以降のページを取得できません: キーワード '{keyword}'")
+                yield None
+                return
+            oldest = min(issue_dates)
+            if cft_issue_date == f"{since}/{oldest}":
+                logger.warning(f"同一公告日の案件が1ページの件数を超えるため取得を打ち切ります: "
+                               f"キーワード '{keyword}', 公告日 {oldest}")
+                yield None
+                return
+            cft_issue_date = f"{since}/{oldest}"
+    
+    def find_known_keys(self, keys):
+        """今回の実行より前に登録済みのキーを取得（実行中に他のキーワードの検索で登録した案件は含めない）"""
+        if not keys:
+            return set()
+        conn = sqlite3.connect(self.db_path)
+        try:
+            placeholders = ','.join('?' * len(keys))
+            cursor = conn.execute(f"SELECT key FROM search_results WHERE key IN ({placeholders}) AND id <= ?",
+                                  keys + [self.known_max_id])
+            return {row[0] for row in cursor}
+        finally:
+            conn.close()
+    
+    def parse_xml_results(self, xml_data, search_keyword):
+        """XML結果をパース"""
+        return self.parse_xml_page(xml_data, search_keyword)[1]
+    
+    def parse_xml_page(self, xml_data, search_keyword):
+        """XML結果をパースし、(検索ヒット数, 結果リスト) を返す"""
+        results = []
+        hits = []
+        
+        try:
+            for record in iter_xml_results(xml_data, search_keyword, on_hits=hits.append):
+                results.append(record)
+        except ET.ParseError as e:
+            logger.error(f"XMLパースエラー: {str(e)}")
+            
+        return (hits[0] if hits else None), results
+
+    def get_openai_client(self):
+        """OpenAIクライアントを取得（初回の使用時に作成、APIキー未設定・初期化失敗時は None）"""
+        with self.openai_lock:
+            if self.openai_client is None and self.openai_api_key and not self.openai_disabled:
+                try:
+                    # openai パッケージの読み込みに時間がかかるため、要約が必要になった時点で読み込む
+                    import openai
+                    self.openai_client = openai.OpenAI(api_key=self.openai_api_key, base_url=self.openai_base_url)
+                    logger.info("OpenAIクライアントを正常に初期化しました")
+                except Exception as e:
+                    self.openai_disabled = True
+                    logger.error(f"OpenAIクライアント初期化エラー: {e}")
+                    logger.warning("OpenAI要約機能は無効化されます")
+            return self.openai_client
+    
+    def get_cache(self):
+        """文書・要約キャッシュを取得（初回使用時に作成）"""
+        if self.cache is None:
+            self.cache = DocumentCache(self.config.get('cache', {}))
+        return self.cache
+    
+    def load_document_text(self, url):
+        """URLの文書を取得してテキストを抽出し、(内容ハッシュ, テキスト) を返す
+        
+        キャッシュが新しい場合は通信せず、古い場合は ETag / Last-Modified で再検証する。
+        要約対象外（HTML）や取得失敗の場合は None を返す。
+        """
+        cache = self.get_cache()
+        cached = cache.get_document(url)
+        
+        # 再検証の間隔内であれば通信しない
+        if cached and time.time() - cached['fetched_at'] < cache.revalidate_after:
+            if not cached['content_hash']:
+                cache.record('document', True)
+                logger.info(f"HTMLファイルの要約はスキップします: {url}")
+                return None
+            text = cache.get_text(cached['content_hash'])
+            if text is not None:
+                cache.record('document', True)
+                return cached['content_hash'], text
+        
+        # テキストがキャッシュにある場合のみ条件付きリクエストで再検証
+        headers = {}
+        if cached and (not cached['content_hash'] or cache.has_text(cached['content_hash'])):
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+        
+        response = self.http.get(url, headers=headers, stream=True)
+        if response.status_code == 304 and headers:
+            response.close()
+            cache.touch_document(url)
+            if not cached['content_hash']:
+                cache.record('document', True)
+                logger.info(f"HTMLファイルの要約はスキップします: {url}")
+                return None
+            text = cache.get_text(cached['content_hash'])
+            if text is not None:
+                cache.record('document', True)
+                return cached['content_hash'], text
+            # 再検証の間にテキストがキャッシュから削除された場合は条件なしで取得し直す
+            logger.info(f"キャッシュのテキストが削除されているため再取得します: {url}")
+            response = self.http.get(url, stream=True)
+        
+        try:
+            cache.record('document', False)
+            if response.status_code != 200:
+                logger.warning(f"要約用にURLを取得できません: {url}")
+                raise requests.exceptions.HTTPError(f"ステータスコード {response.status_code}", response=response)
+            
+            content_type = response.headers.get("Content-Type", "").lower()
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            is_pdf = "application/pdf" in content_type or url.lower().endswith(".pdf")
+            
+            if not is_pdf:
+                # HTMLの場合は要約しない（ポータルサイトの可能性が高いため）
+                cache.put_document(url, None, content_type, etag, last_modified)
+                logger.info(f"HTMLファイルの要約はスキップします: {url}")
+                return None
+            
+            # 本文はメモリに展開せず、上限サイズまで一時ファイルに書き出す
+            pdf_path, content_hash = self.download_to_file(response, url)
+        finally:
+            response.close()
+        
+        try:
+            cache.put_document(url, content_hash, content_type, etag, last_modified)
+            
+            # 同じ内容の文書は別URLでも抽出済みテキストを再利用する
+            text = cache.get_text(content_hash)
+            if text is None:
+                logger.info(f"PDFファイルからテキストを抽出します: {url}")
+                text = self.extract_pdf_text(pdf_path)
+                cache.put_text(content_hash, text)
+            return content_hash, text
+        finally:
+            os.unlink(pdf_path)
+    
+    def download_to_file(self, response, url):
+        """レスポンス本文をサイズ上限付きで一時ファイルに保存し、(パス, 内容ハッシュ) を返す"""
+        max_bytes = int(float(self.config.get('pdf', {}).get('max_size_mb', 20)) * 1024 * 1024)
+        content_length = response.headers.get('Content-Length', '')
+        if content_length.isdigit() and int(content_length) > max_bytes:
+            raise ValueError(f"PDFのサイズが上限を超えています ({int(content_length)} バイト): {url}")
+        
+        digest = hashlib.sha256()
+        size = 0
+        with tempfile.NamedTemporaryFile(prefix='kkj_', suffix='.pdf', delete=False) as f:
+            try:
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise ValueError(f"PDFのサイズが上限を超えています (> {max_bytes} バイト): {url}")
+                    digest.update(chunk)
+                    f.write(chunk)
+            except BaseException:
+                f.close()
+                os.unlink(f.name)
+                raise
+        return f.name, digest.hexdigest()
+    
+    def get_extract_pool(self):
+        """PDFテキスト抽出用のプロセスプールを取得（初回使用時に作成）"""
+        with self.extract_lock:
+            if self.extract_pool is None:
+                pdf_config = self.config.get('pdf', {})
+                self.extract_pool = ProcessPoolExecutor(
+                    max_workers=max(1, int(pdf_config.get('max_processes', 2))),
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=init_extract_worker,
+                    initargs=(int(pdf_config.get('max_memory_mb', 512)),),
+                )
+            return self.extract_pool
+    
+    def reset_extract_pool(self, pool):
+        """応答しない・異常終了したプロセスプールを破棄（次回使用時に作り直す）
+        
+        shutdown だけでは処理中のワーカーは停止しないため、ワーカープロセスを強制終了する
+        （同じプールで処理中の他の抽出も異常終了として扱われる）。
+        """
+        with self.extract_lock:
+            if self.extract_pool is pool:
+                self.extract_pool = None
+        # ProcessPoolExecutor はワーカーを停止する公開APIを持たないため、内部のプロセス一覧を使用する
+        processes = list((getattr(pool, '_processes', None) or {}).values())
+        pool.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.kill()
+                process.join(timeout=5)
+    
+    def extract_pdf_text(self, pdf_path):
+        """PDFファイルからテキストを抽出（別プロセスで時間・CPU・メモリを制限して実行）"""
+        pdf_config = self.config.get('pdf', {})
+        max_pages = max(1, int(pdf_config.get('max_pages', 10)))
+        max_chars = max(1, int(pdf_config.get('max_chars', 20000)))
+        cpu_seconds = max(1, int(pdf_config.get('cpu_seconds', 30)))
+        timeout = float(pdf_config.get('timeout_seconds', 60))
+        
+        pool = self.get_extract_pool()
+        future = pool.submit(extract_pdf_text_worker, pdf_path, max_pages, max_chars, cpu_seconds)
+        try:
+            text, pages_read, total_pages = future.result(timeout=timeout)
+        except FuturesTimeoutError:
+            self.reset_extract_pool(pool)
+            raise TimeoutError(f"PDFテキスト抽出が{timeout:.0f}秒以内に完了しませんでした")
+        except BrokenProcessPool:
+            # CPU時間・メモリの上限を超えたワーカーは強制終了される
+            self.reset_extract_pool(pool)
+            raise RuntimeError("PDFテキスト抽出プロセスが異常終了しました（CPU時間またはメモリの上限超過）")
+        
+        if pages_read < total_pages:
+            logger.info(f"PDF全{total_pages}ページのうち、最初の{pages_read}ページのみ処理しました")
+        return text
+    
+    def summarize_url(self, url):
+        """URLの内容をChatGPTで要約 (PDFにも対応)"""
+        return self.summarize_document(url)[0]
+    
+    def summarize_document(self, url):
+        """URLの内容を要約し、(要約, エラー内容) を返す
+        
+        要約対象外の場合は (None, None)、再試行が必要な失敗の場合はエラー内容を返す。
+        """
+        summary, error, request = self.prepare_summary(url)
+        if request is None:
+            return summary, error
+        content_hash, prompt = request
+        return self.request_summary(content_hash, prompt)
+    
+    def prepare_summary(self, url):
+        """LLM呼び出しの前までを行い、(要約, エラー内容, リクエスト) を返す
+        
+        キャッシュやローカル抽出で要約できた場合、または要約対象外・失敗の場合はリクエストが None。
+        LLMによる要約が必要な場合はリクエストとして (内容ハッシュ, プロンプト) を返す。
+        """
+        if not url:
+            return None, None, None
+        
+        if not self.openai_api_key:
+            logger.warning("OpenAI APIキーが設定されていません")
+            return None, None, None
+            
+        if not self.get_openai_client():
+            logger.warning("OpenAIクライアントが初期化されていません")
+            return None, None, None
+        
+        try:
+            document = self.load_document_text(url)
+        except requests.exceptions.RequestException as e:
+            logger.error(f"ChatGPT要約エラー: {e}")
+            return None, f"取得エラー: {e}", None
+        except Exception as pdf_error:
+            logger.error(f"PDF処理エラー: {pdf_error}")
+            return "（PDFファイル - 処理エラー）", f"PDF処理エラー: {pdf_error}", None
+        if document is None:
+            return None, None, None
+        content_hash, text = document
+        
+        if not text.strip():
+            logger.warning(f"PDFからテキストを抽出できませんでした: {url}")
+            return "（PDFファイル - テキスト抽出失敗）", None, None
+        
+        # 同じ内容・モデル・プロンプトの要約は再利用する
+        cache = self.get_cache()
+        summary = cache.get_summary(content_hash, self.openai_model, SUMMARY_PROMPT_VERSION)
+        if summary is not None:
+            logger.info(f"要約キャッシュを使用します: {url}")
+            return summary, None, None
+        
+        # 正規表現で十分な項目を抽出できた場合はAPIを呼び出さない
+        summary = self.summarize_locally(text)
+        if summary is not None:
+            logger.info(f"ローカル抽出で要約を作成しました（API呼び出しを省略）: {url}")
+            return summary, None, None
+        
+        # テキストが長すぎる場合は要約項目に関連する段落を優先して上限内に収める
+        max_tokens = int(self.config.get('summary', {}).get('max_prompt_tokens', 2000))
+        if estimate_tokens(text) > max_tokens:
+            text = select_relevant_text(text, max_tokens)
+            logger.info(f"PDFテキストが長いため、関連する段落のみ使用します（約{estimate_tokens(text)}トークン）")
+        return None, None, (content_hash, SUMMARY_PROMPT.format(text=text))
+    
+    def summary_request_body(self, prompt):
+        """要約用の Chat Completions リクエスト内容"""
+        return {
+            "model": self.openai_model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": 400,
         }
+    
+    def request_summary(self, content_hash, prompt):
+        """LLMで要約を生成してキャッシュに保存し、(要約, エラー内容) を返す"""
+        try:
+            started = time.monotonic()
+            result = self.openai_client.chat.completions.create(**self.summary_request_body(prompt))
+            summary = result.choices[0].message.content.strip()
+            with self.extract_lock:
+                self.extraction_stats['llm_calls'] += 1
+                self.extraction_stats['llm_seconds'] += time.monotonic() - started
+            self.get_cache().put_summary(content_hash, self.openai_model, SUMMARY_PROMPT_VERSION, summary)
+            return summary, None
+            
+        except Exception as pdf_error:
+            logger.error(f"PDF処理エラー: {pdf_error}")
+            return "（PDFファイル - 処理エラー）", f"要約エラー: {pdf_error}"
+    
+    def summarize_locally(self, text):
+        """正規表現による項目抽出を行い、設定した項目数以上を抽出できた場合は要約を返す"""
+        summary_config = self.config.get('summary', {})
+        if not summary_config.get('local_extraction', True):
+            return None
+        fields = extract_summary_fields(text)
+        
+        with self.extract_lock:
+            stats = self.extraction_stats
+            stats['documents'] += 1
+            for field in fields:
+                stats['fields'][field] = stats['fields'].get(field, 0) + 1
+            if len(fields) < int(summary_config.get('local_min_fields', 7)):
+                return None
+            stats['llm_skipped'] += 1
+        return format_local_summary(fields)
+    
+    def log_extraction_stats(self):
+        """ローカル抽出の項目別ヒット率とAPI呼び出しの省略数をログに出力"""
+        stats = self.extraction_stats
+        if not stats['documents']:
+            return
+        documents = stats['documents']
+        hit_rates = ', '.join(f"{field} {stats['fields'].get(field, 0) / documents * 100:.0f}%"
+                              for field in SUMMARY_FIELD_CUES)
+        logger.info(f"ローカル抽出の項目別ヒット率（{documents} 件）: {hit_rates}")
+        message = f"ローカル抽出によりAPI呼び出しを {stats['llm_skipped']}/{documents} 件省略しました"
+        if stats['llm_calls']:
+            average = stats['llm_seconds'] / stats['llm_calls']
+            message += f"（API呼び出し平均 {average:.1f}秒、推定 {average * stats['llm_skipped']:.0f}秒短縮）"
+        logger.info(message)
+    
+    def get_stored_summaries(self, keys):
+        """データベースに保存済みの要約を {キー: 要約} で取得"""
+        summaries = {}
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            cursor = self.get_connection().execute(f"""
+                SELECT key, summary FROM enrichment
+                WHERE key IN ({placeholders}) AND state = 'done' AND summary IS NOT NULL
+            """, chunk)
+            summaries.update(cursor.fetchall())
+        return summaries
+    
+    def store_summary_results(self, results):
+        """要約結果 {キー: (要約, エラー内容)} をキューに反映"""
+        max_attempts = int(self.config.get('summary', {}).get('max_attempts', 3))
+        try:
+            with self.get_connection() as conn:
+                for key, (summary, error) in results.items():
+                    if error:
+                        # 上限回数に達した場合は failed のまま再試行しない
+                        conn.execute('''
+                            UPDATE enrichment SET state = 'failed', last_error = ?,
+                                attempts = MAX(attempts, 1), updated_at = CURRENT_TIMESTAMP
+                            WHERE key = ?
+                        ''', (error, key))
+                    else:
+                        conn.execute('''
+                            UPDATE enrichment SET state = 'done', summary = ?, last_error = NULL,
+                                updated_at = CURRENT_TIMESTAMP
+                            WHERE key = ?
+                        ''', (summary, key))
+            failed = sum(1 for _, error in results.values() if error)
+            if failed:
+                logger.warning(f"要約に失敗した {failed} 件は最大{max_attempts}回まで --enrich で再試行されます")
+        except sqlite3.Error as e:
+            logger.error(f"データベースエラー: {str(e)}")
+    
+    def summarize_items(self, items):
+        """案件の要約を並列に生成し、制限時間内に完了した要約を {キー: 要約} で返す
+        
+        保存済みの要約は再利用し、生成した要約はデータベースに保存する。
+        summary.mode が queue の場合は生成を --enrich に任せ、保存済みの要約のみを返す。
+        完了しなかった案件には SUMMARY_PENDING を設定する。
+        """
+        summary_config = self.config.get('summary', {})
+        stored = self.get_stored_summaries([item['key'] for item in items])
+        targets = [item for item in items if item['external_document_uri'] and item['key'] not in stored]
+        if not targets or not self.get_openai_client():
+            return stored
+        if summary_config.get('mode', 'inline') == 'queue':
+            logger.info(f"要約は --enrich で生成します: 未完了 {len(targets)} 件")
+            return {**stored, **{item['key']: SUMMARY_PENDING for item in targets}}
+        
+        max_workers = max(1, int(summary_config.get('max_workers', 4)))
+        time_budget = float(summary_config.get('time_budget_seconds', 120))
+        
+        # ワーカーから同時に作成されないよう、事前にキャッシュを開いておく
+        self.get_cache()
+        if self.summary_executor is None:
+            self.summary_executor = ThreadPoolExecutor(max_workers=max_workers)
+        
+        # 同じURLの要約は1回だけ生成する
+        futures = {}
+        for url in dict.fromkeys(item['external_document_uri'] for item in targets):
+            futures[url] = self.summary_executor.submit(self.summarize_document, url)
+        
+        logger.info(f"要約を開始します: {len(futures)} 件, 同時実行数 {max_workers}, 制限時間 {time_budget:.0f}秒")
+        started = time.monotonic()
+        done, not_done = wait(futures.values(), timeout=time_budget)
+        for future in not_done:
+            future.cancel()
+        
+        # 完了した要約を保存（未完了の案件は pending のまま --enrich で処理される）
+        results = {}
+        summaries = dict(stored)
+        for item in targets:
+            future = futures[item['external_document_uri']]
+            if future in done:
+                results[item['key']] = future.result()
+                summaries[item['key']] = results[item['key']][0]
+            else:
+                summaries[item['key']] = SUMMARY_PENDING
+        self.store_summary_results(results)
+        
+        logger.info(f"要約が完了しました: {len(done)}/{len(futures)} 件 ({time.monotonic() - started:.1f}秒)")
+        if not_done:
+            logger.warning(f"制限時間内に完了しなかった要約 {len(not_done)} 件は省略して通知します")
+        return summaries
+    
+    def reset_stale_enrichment(self):
+        """異常終了したワーカーが running のまま残した案件を pending に戻す"""
+        with self.get_connection() as conn:
+            conn.execute('''
+                UPDATE enrichment SET state = 'pending'
+                WHERE state = 'running' AND updated_at < datetime('now', '-1 hour')
+            ''')
+    
+    def claim_enrichment(self, limit):
+        """処理対象の案件を running に更新して (キー, URL) のリストを返す"""
+        summary_config = self.config.get('summary', {})
+        max_attempts = int(summary_config.get('max_attempts', 3))
+        retry_minutes = max(1, int(summary_config.get('retry_interval_minutes', 10)))
+        conn = self.get_connection()
+        # 他のワーカーと重複しないよう1トランザクションで取得・更新する
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # failed は前回の試行から 再試行間隔 × 2^(試行回数-1) 分経過したものだけを対象にする
+            claimed = conn.execute('''
+                SELECT key, url FROM enrichment
+                WHERE attempts < ? AND (
+                    state = 'pending'
+                    OR (state = 'failed' AND updated_at <= datetime('now',
+                        printf('-%d minutes', ? * (1 << MAX(attempts - 1, 0)))))
+                )
+                ORDER BY created_at LIMIT ?
+            ''', (max_attempts, retry_minutes, limit)).fetchall()
+            conn.executemany('''
+                UPDATE enrichment SET state = 'running', attempts = attempts + 1,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE key = ?
+            ''', [(key,) for key, _ in claimed])
+        return claimed
+    
+    def enrich(self):
+        """要約キュー（pending / 再試行可能な failed）を処理"""
+        if not self.get_openai_client():
+            logger.warning("OpenAIクライアントが初期化されていないため、要約キューを処理できません")
+            return
+        
+        summary_config = self.config.get('summary', {})
+        max_workers = max(1, int(summary_config.get('max_workers', 4)))
+        batch_size = max(1, int(summary_config.get('enrich_batch_size', 50)))
+        self.get_cache()
+        self.reset_stale_enrichment()
+        
+        processed = failed = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while True:
+                claimed = self.claim_enrichment(batch_size)
+                if not claimed:
+                    break
+                
+                logger.info(f"要約キューを処理します: {len(claimed)} 件")
+                futures = {executor.submit(self.summarize_document, url): key for key, url in claimed}
+                for future in as_completed(futures):
+                    result = future.result()
+                    self.store_summary_results({futures[future]: result})
+                    processed += 1
+                    if result[1]:
+                        failed += 1
+        
+        logger.info(f"要約キューの処理が完了しました: {processed} 件（失敗 {failed} 件）")
+        if self.cache is not None:
+            self.cache.log_stats()
+        self.log_extraction_stats()
+    
+    def enrich_batch(self, wait_for_completion=False):
+        """要約キューを OpenAI Batch API でまとめて処理
+        
+        投入済みバッチの結果を取り込んでから、キューに残った案件を1つのバッチとして投入する。
+        wait_for_completion が True の場合は全バッチの完了まで待機する。
+        """
+        if not self.get_openai_client():
+            logger.warning("OpenAIクライアントが初期化されていないため、要約キューを処理できません")
+            return
+        
+        poll_seconds = max(1.0, float(self.config.get('openai', {}).get('batch_poll_seconds', 60)))
+        self.get_cache()
+        self.reset_stale_enrichment()
+        
+        outstanding = self.poll_summary_batches()
+        outstanding += self.submit_summary_batch()
+        while wait_for_completion and outstanding:
+            logger.info(f"バッチの完了を待機しています: {outstanding} 件（{poll_seconds:.0f}秒ごとに確認）")
+            time.sleep(poll_seconds)
+            outstanding = self.poll_summary_batches()
+        
+        if outstanding:
+            logger.info(f"未完了のバッチ {outstanding} 件の結果は次回の --enrich --batch で取り込みます")
+        if self.cache is not None:
+            self.cache.log_stats()
+        self.log_extraction_stats()
+    
+    def submit_summary_batch(self):
+        """キューの案件のプロンプトをJSONLにまとめて Batch API に投入し、投入したバッチ数を返す"""
+        openai_config = self.config.get('openai', {})
+        max_requests = max(1, int(openai_config.get('batch_max_requests', 1000)))
+        max_workers = max(1, int(self.config.get('summary', {}).get('max_workers', 4)))
+        claimed = self.claim_enrichment(max_requests)
+        if not claimed:
+            logger.info("バッチに投入する要約はありません")
+            return 0
+        
+        # 文書の取得・テキスト抽出は並列に行い、LLMによる要約が必要な案件のみバッチに含める
+        results = {}
+        prompts = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(self.prepare_summary, url): key for key, url in claimed}
+            for future in as_completed(futures):
+                summary, error, request = future.result()
+                if request is None:
+                    results[futures[future]] = (summary, error)
+                else:
+                    prompts[futures[future]] = request
+        self.store_summary_results(results)
+        if not prompts:
+            logger.info(f"バッチに投入する要約はありません（{len(results)} 件はバッチを使用せずに処理しました）")
+            return 0
+        
+        # custom_id には案件キーと内容ハッシュを含め、結果を要約キャッシュにも保存できるようにする
+        lines = [json.dumps({
+            "custom_id": f"{key}|{content_hash}",
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": self.summary_request_body(prompt),
+        }, ensure_ascii=False) for key, (content_hash, prompt) in prompts.items()]
+        try:
+            input_file = self.openai_client.files.create(
+                file=('kkj_summary_batch.jsonl', ('\n'.join(lines) + '\n').encode('utf-8')),
+                purpose='batch',
+            )
+            batch = self.openai_client.batches.create(
+                input_file_id=input_file.id,
+                endpoint='/v1/chat/completions',
+                completion_window=openai_config.get('batch_completion_window', '24h'),
+            )
+        except Exception as e:
+            logger.error(f"バッチ投入エラー: {e}")
+            self.store_summary_results({key: (None, f"バッチ投入エラー: {e}") for key in prompts})
+            return 0
+        
+        try:
+            with self.get_connection() as conn:
+                conn.execute('''
+                    INSERT INTO summary_batches (batch_id, status, input_file_id, request_count)
+                    VALUES (?, ?, ?, ?)
+                ''', (batch.id, batch.status, input_file.id, len(prompts)))
+                conn.executemany('''
+                    UPDATE enrichment SET state = 'batched', batch_id = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE key = ?
+                ''', [(batch.id, key) for key in prompts])
+        except sqlite3.Error as e:
+            logger.error(f"データベースエラー: {str(e)}")
+            return 0
+        
+        logger.info(f"要約バッチを投入しました: {batch.id}（{len(prompts)} 件, "
+                    f"バッチを使用せずに処理 {len(results)} 件）")
+        return 1
+    
+    def poll_summary_batches(self):
+        """投入済みバッチの状態を確認し、終了したバッチの結果を取り込んで未完了のバッチ数を返す"""
+        conn = self.get_connection()
+        placeholders = ','.join('?' * len(BATCH_FINAL_STATUSES))
+        batch_ids = [row[0] for row in conn.execute(
+            f"SELECT batch_id FROM summary_batches WHERE status NOT IN ({placeholders}) ORDER BY created_at",
+            BATCH_FINAL_STATUSES)]
+        
+        outstanding = 0
+        for batch_id in batch_ids:
+            try:
+                batch = self.openai_client.batches.retrieve(batch_id)
+                results = self.read_batch_results(batch) if batch.status in BATCH_FINAL_STATUSES else {}
+            except Exception as e:
+                logger.error(f"バッチの確認エラー: {batch_id} - {e}")
+                outstanding += 1
+                continue
+            
+            if batch.status not in BATCH_FINAL_STATUSES:
+                outstanding += 1
+                with conn:
+                    conn.execute('''
+                        UPDATE summary_batches SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE batch_id = ?
+                    ''', (batch.status, batch_id))
+                continue
+            
+            # 結果のない案件（期限切れ・キャンセルなど）は failed とし、通常の再試行に任せる
+            for (key,) in conn.execute(
+                    "SELECT key FROM enrichment WHERE batch_id = ? AND state = 'batched'", (batch_id,)).fetchall():
+                results.setdefault(key, (None, f"バッチ処理エラー: {batch.status}"))
+            self.store_summary_results(results)
+            with conn:
+                conn.execute('''
+                    UPDATE summary_batches SET status = ?, output_file_id = ?, error_file_id = ?,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE batch_id = ?
+                ''', (batch.status, batch.output_file_id, batch.error_file_id, batch_id))
+            failed = sum(1 for _, error in results.values() if error)
+            logger.info(f"要約バッチの結果を取り込みました: {batch_id}（{batch.status}, "
+                        f"{len(results)} 件, 失敗 {failed} 件）")
+        return outstanding
+    
+    def read_batch_results(self, batch):
+        """バッチの出力・エラーファイルを読み込み、{キー: (要約, エラー内容)} を返す"""
+        results = {}
+        cache = self.get_cache()
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in self.openai_client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                key, _, content_hash = record['custom_id'].rpartition('|')
+                response = record.get('response') or {}
+                if response.get('status_code') == 200:
+                    summary = response['body']['choices'][0]['message']['content'].strip()
+                    cache.put_summary(content_hash, self.openai_model, SUMMARY_PROMPT_VERSION, summary)
+                    results[key] = (summary, None)
+                else:
+                    error = record.get('error') or (response.get('body') or {}).get('error')
+                    results[key] = (None, f"要約エラー: {error or response.get('status_code')}")
+        return results
+    
+    def save_to_database(self, results, keyword_hits=None):
+        """検索結果をデータベースに一括保存し、新規案件を返す
+        
+        keyword_hits には (キー, キーワード) のリストを指定する。
+        省略時は各結果の search_keyword を記録する。保存に失敗した場合は None を返す。
+        """
+        if not results:
+            return []
+        if keyword_hits is None:
+            keyword_hits = [(r['key'], r['search_keyword']) for r in results if r['search_keyword']]
+        
+        conn = self.get_connection()
+        columns = ', '.join(SearchRecord.__slots__)
+        placeholders = ', '.join('?' * len(SearchRecord.__slots__))
+        rows = [tuple(result[name] for name in SearchRecord.__slots__) for result in results]
         
         try:
-            logger.info(f"検索実行: 機関名={self.config['organization']}, 件名キーワード={keyword}")
-            response = requests.get(self.api_url, params=params, timeout=30)
-            response.encoding = 'utf-8'
-            
-            if response.status_code != 200:
-                logger.error(f"APIエラー: ステータスコード {response.status_code}")
-                return None
+            # 1バッチを1トランザクションで登録する
+            with conn:
+                conn.execute("DELETE FROM temp.ingest")
+                conn.executemany(f"INSERT INTO temp.ingest ({columns}) VALUES ({placeholders})", rows)
                 
-            return response.text
-            
-        except requests.exceptions.RequestException as e:
-            logger.error(f"API通信エラー: {str(e)}")
+                # 未登録のキーを1回のクエリで判定
+                new_keys = {row[0] for row in conn.execute('''
+                    SELECT key FROM temp.ingest
+                    WHERE key NOT IN (SELECT key FROM search_results)
+                ''')}
+                
+                # 文書URLのある新規案件を要約キューに登録
+                conn.execute('''
+                    INSERT OR IGNORE INTO enrichment (key, url)
+                    SELECT key, external_document_uri FROM temp.ingest
+                    WHERE external_document_uri IS NOT NULL
+                      AND key NOT IN (SELECT key FROM search_results)
+                ''')
+                
+                # 新規案件を集計テーブルに加算（同じキーが複数含まれる場合は1件として数える）
+                conn.execute('''
+                    INSERT INTO daily_stats (day, keyword, category, organization_name, count)
+                    SELECT date('now'), COALESCE(search_keyword, ''), COALESCE(category, ''),
+                           COALESCE(organization_name, ''), COUNT(*)
+                    FROM (SELECT * FROM temp.ingest
+                          WHERE key NOT IN (SELECT key FROM search_results) GROUP BY key)
+                    WHERE true
+                    GROUP BY 2, 3, 4
+                    ON CONFLICT (day, keyword, category, organization_name) DO UPDATE SET count = count + excluded.count
+                ''')
+                
+                # 日付は並べ替え・範囲検索できるよう正規化した値も保存する
+                conn.execute(f"""
+                    INSERT OR IGNORE INTO search_results ({columns}, {', '.join(DATE_COLUMNS.values())})
+                    SELECT {columns}, {', '.join(f'normalize_date({c})' for c in DATE_COLUMNS)} FROM temp.ingest
+                """)
+                conn.executemany("INSERT OR IGNORE INTO keyword_hits (key, keyword) VALUES (?, ?)", keyword_hits)
+        except sqlite3.Error as e:
+            logger.error(f"データベースエラー: {str(e)}")
             return None
+        
+        new_items = []
+        for result in results:
+            if result['key'] in new_keys:
+                new_items.append(result)
+                new_keys.discard(result['key'])
+        
+        return new_items
     
-    def parse_xml_results(self, xml_data, search_keyword):
-        """XML結果をパース"""
-        results = []
+    def get_keyword_hits(self, keys):
+        """案件キーごとに一致したキーワードの一覧を取得"""
+        hits = {}
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            cursor = self.get_connection().execute(
+                f"SELECT key, keyword FROM keyword_hits WHERE key IN ({placeholders}) ORDER BY rowid", chunk)
+            for key, keyword in cursor:
+                hits.setdefault(key, []).append(keyword)
+        return hits
+    
+    def get_unnotified_items(self, profile, exclude_keys=()):
+        """プロファイルの機関名・キーワードに一致する未通知の案件を登録順に取得
         
+        前回までの実行で保存したものの通知メールを送信待ちに登録できなかった案件（異常終了・登録失敗、
+        paginate が false の場合の上限を超えた分など）を通知の対象に戻す。
+        このプロファイルの送信待ち・送信中のメールに含まれる案件は除く。
+        """
+        if not profile['organizations'] or not profile['keywords']:
+            return []
+        organizations = ' OR '.join(['instr(r.organization_name, ?) > 0'] * len(profile['organizations']))
+        keywords = ','.join('?' * len(profile['keywords']))
+        columns = ', '.join(f'r.{name}' for name in SearchRecord.__slots__)
         try:
-            root = ET.fromstring(xml_data)
-            
-            # エラーチェック
-            error = root.find('Error')
-            if error is not None:
-                logger.error(f"APIエラー: {error.text}")
-                return results
-            
-            search_results = root.find('SearchResults')
-            if search_results is None:
-                return results
-                
-            search_hits = search_results.find('SearchHits')
-            if search_hits is not None:
-                logger.info(f"検索ヒット数: {search_hits.text}")
-            
-            for result in search_results.findall('SearchResult'):
-                data = {
-                    'key': self.get_xml_value(result, 'Key'),
-                    'project_name': self.get_xml_value(result, 'ProjectName'),
-                    'organization_name': self.get_xml_value(result, 'OrganizationName'),
-                    'cft_issue_date': self.get_xml_value(result, 'CftIssueDate'),
-                    'category': self.get_xml_value(result, 'Category'),
-                    'procedure_type': self.get_xml_value(result, 'ProcedureType'),
-                    'location': self.get_xml_value(result, 'Location'),
-                    'tender_submission_deadline': self.get_xml_value(result, 'TenderSubmissionDeadline'),
-                    'opening_tenders_event': self.get_xml_value(result, 'OpeningTendersEvent'),
-                    'period_end_time': self.get_xml_value(result, 'PeriodEndTime'),
-                    'external_document_uri': self.get_xml_value(result, 'ExternalDocumentURI'),
-                    'file_type': self.get_xml_value(result, 'FileType'),
-                    'file_size': self.get_xml_value(result, 'FileSize', is_int=True),
-                    'search_keyword': search_keyword
-                }
-                results.append(data)
-                
-        except ET.ParseError as e:
-            logger.error(f"XMLパースエラー: {str(e)}")
-            
-        return results
+            cursor = self.get_connection().execute(f'''
+                SELECT {columns} FROM search_results r
+                WHERE r.notified = 0
+                  AND ({organizations})
+                  AND (EXISTS (SELECT 1 FROM keyword_hits h WHERE h.key = r.key AND h.keyword IN ({keywords}))
+                       OR (r.search_keyword IN ({keywords})
+                           AND NOT EXISTS (SELECT 1 FROM keyword_hits h WHERE h.key = r.key)))
+                  AND r.key NOT IN (
+                      SELECT j.value FROM outbox o, json_each(o.item_keys) j
+                      WHERE o.profile = ? AND o.state IN ('pending', 'sending'))
+                ORDER BY r.id
+            ''', [*profile['organizations'], *profile['keywords'], *profile['keywords'], profile['name']])
+            items = [dict(zip(SearchRecord.__slots__, row)) for row in cursor]
+        except sqlite3.Error as e:
+            logger.error(f"データベースエラー: {str(e)}")
+            return []
+        exclude_keys = set(exclude_keys)
+        return [item for item in items if item['key'] not in exclude_keys]
     
-    def get_xml_value(self, element, tag_name, is_int=False):
-        """XML要素から値を取得"""
-        tag = element.find(tag_name)
-        if tag is not None and tag.text:
-            if is_int:
-                try:
-                    return int(tag.text)
-                except ValueError:
-                    return None
-            return tag.text
-        return None
-
-    def summarize_url(self, url):
-        """URLの内容をChatGPTで要約 (PDFにも対応)"""
-        if not url:
-            return None
+    def send_notification(self, new_items, profile=None, summaries=None):
+        """新規案件をプロファイルの宛先にメール通知（案件がない場合も通知）
         
-        if not self.openai_api_key:
-            logger.warning("OpenAI APIキーが設定されていません")
-            return None
-            
-        if not self.openai_client:
-            logger.warning("OpenAIクライアントが初期化されていません")
-            return None
+        案件数が max_items_per_mail を超える場合は、連番付きの複数のメールに分けて1回のSMTP接続で送信する。
+        案件を含むメールは送信待ち（outbox）に登録してから送信し、失敗した場合は次回以降に再送する。
+        summaries には生成済みの要約（{キー: 要約}）を指定でき、省略した場合は通知する案件の要約を生成する。
+        送信に成功した場合は True を返す。
+        """
+        if profile is None:
+            profiles = self.get_profiles()
+            if not profiles:
+                logger.error("通知先のプロファイルがありません（機関名を設定してください）")
+                return False
+            profile = profiles[0]
+        
+        if new_items:
+            logger.info(f"メール送信を開始します: 新規案件 {len(new_items)} 件")
+        else:
+            logger.info(f"メール送信を開始します: 新規案件なし（通知のみ）")
+        messages = self.build_notification_messages(new_items, profile, summaries)
         
+        if not new_items:
+            # 案件のない通知は再送しない
+            sent, error = self.send_messages([msg for msg, _ in messages])
+            if error is None:
+                logger.info(f"メール通知を送信しました: 新規案件なし")
+            return error is None
+        
+        if not self.enqueue_outbox(profile, messages):
+            return False
+        if not self.flush_outbox():
+            return False
+        logger.info(f"メール通知を送信しました: 新規案件 {len(new_items)} 件（{len(messages)} 通）")
+        return True
+    
+    def enqueue_outbox(self, profile, messages):
+        """作成したメールと含まれる案件キーを送信待ちに登録"""
         try:
-            response = requests.get(url, timeout=30)
-            if response.status_code != 200:
-                logger.warning(f"要約用にURLを取得できません: {url}")
-                return None
-
-            content_type = response.headers.get("Content-Type", "").lower()
-            is_pdf = "application/pdf" in content_type or url.lower().endswith(".pdf")
-
-            if is_pdf:
-                # PDFファイルからテキストを抽出
-                logger.info(f"PDFファイルからテキストを抽出します: {url}")
-                try:
-                    # PDFデータをメモリに読み込む
-                    pdf_file = io.BytesIO(response.content)
-                    pdf_reader = PdfReader(pdf_file)
-                    
-                    # 全ページのテキストを抽出
-                    text = ""
-                    for page_num, page in enumerate(pdf_reader.pages):
-                        page_text = page.extract_text()
-                        if page_text:
-                            text += page_text + "\n"
-                        # 最大10ページまで読み込む（大きすぎるPDFの場合）
-                        if page_num >= 9:
-                            logger.info(f"PDFが大きいため、最初の10ページのみ処理します")
-                            break
-                    
-                    if not text.strip():
-                        logger.warning(f"PDFからテキストを抽出できませんでした: {url}")
-                        return "（PDFファイル - テキスト抽出失敗）"
-                    
-                    # テキストが長すぎる場合は最初の4000文字に制限
-                    if len(text) > 4000:
-                        text = text[:4000]
-                        logger.info(f"PDFテキストが長いため、最初の4000文字のみ使用します")
-                    
-                    prompt = f"""以下は官公需の入札案件PDFから抽出したテキストです。
-以下に従い、情報を抽出してください。ただし、Markdown形式にせず、各項目は：の後に出力し、改行するにととどめてください。
-例えば次のように出力します。
-「案件の概要：〜〜〜
-履行期間：〜〜〜
-要求元：〜〜〜」
-また、以下の通り各項目を抽出しました、等の説明は不要です。各項目の抽出だけ行ってください。
-抽出する情報は下記のとおりです。
-・案件の概要
-・履行期間
-・要求元
-・入札方式
-・参加表明期限
-・履行体制に関する資料提出期限
-・提案書などの提出期限
-・入札日時
-・入札制限の記載
-
-{text}"""
-                    result = self.openai_client.chat.completions.create(
-                        model=self.openai_model,
-                        messages=[{"role": "user", "content": prompt}],
-                        max_tokens=400,
-                    )
-                    return result.choices[0].message.content.strip()
-                    
-                except Exception as pdf_error:
-                    logger.error(f"PDF処理エラー: {pdf_error}")
-                    return "（PDFファイル - 処理エラー）"
-            else:
-                # HTMLの場合は要約しない（ポータルサイトの可能性が高いため）
-                logger.info(f"HTMLファイルの要約はスキップします: {url}")
-                return None
-        except Exception as e:
-            logger.error(f"ChatGPT要約エラー: {e}")
-            return None
+            with self.get_connection() as conn:
+                conn.executemany('''
+                    INSERT INTO outbox (profile, subject, message, item_keys) VALUES (?, ?, ?, ?)
+                ''', [(profile['name'], str(msg['Subject']), msg.as_string(), json.dumps(keys))
+                      for msg, keys in messages])
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"データベースエラー: {str(e)}")
+            return False
     
-    def save_to_database(self, results):
-        """検索結果をデータベースに保存"""
-        new_items = []
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    # 送信中として確保したメールを、異常終了したとみなして再送の対象に戻すまでの時間（分）
+    OUTBOX_CLAIM_MINUTES = 30
+    
+    def flush_outbox(self):
+        """送信時刻に達した送信待ちのメールを1回のSMTP接続で送信し、すべて送信できた場合は True を返す
         
-        for result in results:
+        送信に失敗したメールは 再送間隔 × 2^(試行回数-1) 分後に再送し、
+        notification.max_attempts 回失敗した場合は failed として再送を止める。
+        送信前に対象のメールを sending として確保するため、同時に実行された他のプロセス
+        （--flush-outbox・常駐プロセスなど）が同じメールを送信することはない。確保したまま
+        異常終了した場合は OUTBOX_CLAIM_MINUTES 分後に再送の対象に戻る。
+        """
+        notification_config = self.config.get('notification', {})
+        max_attempts = max(1, int(notification_config.get('max_attempts', 5)))
+        retry_minutes = max(1, int(notification_config.get('retry_interval_minutes', 5)))
+        conn = self.get_connection()
+        try:
+            # 書き込みロックを取得してから対象を選ぶことで、他のプロセスと同じメールを確保しない
+            conn.execute("BEGIN IMMEDIATE")
             try:
-                cursor.execute('''
-                    INSERT OR IGNORE INTO search_results (
-                        key, project_name, organization_name, cft_issue_date,
-                        category, procedure_type, location, tender_submission_deadline,
-                        opening_tenders_event, period_end_time, external_document_uri,
-                        file_type, file_size, search_keyword
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    result['key'], result['project_name'], result['organization_name'],
-                    result['cft_issue_date'], result['category'], result['procedure_type'],
-                    result['location'], result['tender_submission_deadline'],
-                    result['opening_tenders_event'], result['period_end_time'],
-                    result['external_document_uri'], result['file_type'],
-                    result['file_size'], result['search_keyword']
-                ))
-                
-                if cursor.rowcount > 0:
-                    new_items.append(result)
-                    
-            except sqlite3.Error as e:
-                logger.error(f"データベースエラー: {str(e)}")
+                rows = conn.execute('''
+                    SELECT id, message, item_keys FROM outbox
+                    WHERE state IN ('pending', 'sending') AND next_attempt_at <= CURRENT_TIMESTAMP
+                    ORDER BY id
+                ''').fetchall()
+                conn.executemany(f'''
+                    UPDATE outbox SET state = 'sending',
+                        next_attempt_at = datetime('now', '+{self.OUTBOX_CLAIM_MINUTES} minutes')
+                    WHERE id = ?
+                ''', [(row[0],) for row in rows])
+                conn.commit()
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+        except sqlite3.Error as e:
+            logger.error(f"データベースエラー: {str(e)}")
+            return False
+        if not rows:
+            return True
         
-        conn.commit()
-        conn.close()
+        sent, error = self.send_messages([message_from_string(message) for _, message, _ in rows])
+        try:
+            with conn:
+                for outbox_id, _, item_keys in rows[:sent]:
+                    conn.execute('''
+                        UPDATE outbox SET state = 'sent', attempts = attempts + 1, last_error = NULL,
+                            sent_at = CURRENT_TIMESTAMP
+                        WHERE id = ?
+                    ''', (outbox_id,))
+                    # 送信に成功したメールに含まれる案件のみを通知済みにする
+                    conn.execute('''
+                        UPDATE search_results SET notified = 1
+                        WHERE notified = 0 AND key IN (SELECT value FROM json_each(?))
+                    ''', (item_keys,))
+                conn.executemany('''
+                    UPDATE outbox SET attempts = attempts + 1, last_error = ?,
+                        state = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END,
+                        next_attempt_at = datetime('now', printf('+%d minutes', ? * (1 << attempts)))
+                    WHERE id = ?
+                ''', [(error, max_attempts, retry_minutes, outbox_id) for outbox_id, _, _ in rows[sent:]])
+        except sqlite3.Error as e:
+            logger.error(f"データベースエラー: {str(e)}")
+            return False
         
-        return new_items
+        if sent < len(rows):
+            logger.warning(f"送信できなかったメール {len(rows) - sent} 通は最大{max_attempts}回まで再送します")
+            return False
+        return True
     
-    def send_notification(self, new_items):
-        """新規案件をメール通知（案件がない場合も通知）"""
-        smtp_config = self.config['smtp']
-        notification_config = self.config['notification']
+    def log_outbox_status(self):
+        """送信待ち・送信失敗のメール数と未通知の案件数をログに出力"""
+        conn = self.get_connection()
+        counts = dict(conn.execute(
+            "SELECT state, COUNT(*) FROM outbox WHERE state IN ('pending', 'sending', 'failed') GROUP BY state").fetchall())
+        unnotified = conn.execute("SELECT COUNT(*) FROM search_results WHERE notified = 0").fetchone()[0]
+        logger.info(f"送信待ち {counts.get('pending', 0) + counts.get('sending', 0)} 通, 送信失敗 {counts.get('failed', 0)} 通, "
+                    f"未通知の案件 {unnotified} 件")
+    
+    def build_notification_messages(self, new_items, profile, summaries=None):
+        """通知メールを (メール, 含まれる案件キーのリスト) のリストで作成
         
-        # メール本文の作成
+        案件数に応じて複数通に分割し、個別送信の場合は宛先ごとに作成する。
+        """
+        notification_config = self.config['notification']
         now = datetime.now().strftime('%Y年%m月%d日 %H:%M')
+        footer = """
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+このメールは自動送信です。
+官公需情報ポータルサイト: http://www.kkj.go.jp/
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+"""
         
         if not new_items:
             # 新規案件がない場合
-            body = f"""
+            bodies = [f"""
 官公需情報検索システムより検索結果のお知らせです。
 
 検索日時: {now}
-機関名: {self.config['organization']}
-検索キーワード: {', '.join(self.config['keywords'])}
+機関名: {', '.join(profile['organizations'])}
+検索キーワード: {', '.join(profile['keywords'])}
 
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 ■ 検索結果
@@ -342,77 +2331,128 @@ class KKJSearchNotifier:
 
 ※ 既に登録済みの案件は除外されています。
 ※ キーワードは件名に対してのみ検索されます。
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-このメールは自動送信です。
-官公需情報ポータルサイト: http://www.kkj.go.jp/
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-"""
+""" + footer]
+            page_keys = [[]]
         else:
-            # 新規案件がある場合
             # メール1通あたりの最大案件数を取得（デフォルト: 50件）
-            max_items = notification_config.get('max_items_per_mail', 50)
+            max_items = max(1, int(notification_config.get('max_items_per_mail', 50)))
             
-            # 案件数が多い場合は制限
-            if len(new_items) > max_items:
-                logger.warning(f"新規案件が{len(new_items)}件と多いため、最初の{max_items}件のみ通知します")
-                items_to_send = new_items[:max_items]
-                remaining = len(new_items) - max_items
+            # paginate が false の場合は従来どおり1通目の案件のみ通知する
+            if notification_config.get('paginate', True):
+                pages = [new_items[i:i + max_items] for i in range(0, len(new_items), max_items)]
             else:
-                items_to_send = new_items
-                remaining = 0
+                pages = [new_items[:max_items]]
+                if len(new_items) > max_items:
+                    logger.warning(f"新規案件が{len(new_items)}件と多いため、最初の{max_items}件のみ通知します"
+                                   f"（残りは次回以降に通知します）")
+            items_to_send = [item for page in pages for item in page]
+            page_keys = [[item['key'] for item in page] for page in pages]
+            remaining = len(new_items) - len(items_to_send)
             
-            body = f"""
+            keyword_hits = self.get_keyword_hits([item['key'] for item in items_to_send])
+            # 要約はメール本文の作成前に並列で生成し、完了したものだけを本文に含める
+            if summaries is None:
+                summaries = self.summarize_items(items_to_send)
+            
+            bodies = []
+            number = 0
+            for page_number, page in enumerate(pages, 1):
+                body = f"""
 官公需情報検索システムより新規案件のお知らせです。
 
 検索日時: {now}
-機関名: {self.config['organization']}
+機関名: {', '.join(profile['organizations'])}
 新規案件数: {len(new_items)} 件"""
 
-            if remaining > 0:
-                body += f"\n※ 案件数が多いため、最初の{max_items}件のみ表示します。（残り{remaining}件）"
-            else:
-                body += f"\n表示案件数: {len(items_to_send)} 件"
+                if remaining > 0:
+                    body += f"\n※ 案件数が多いため、最初の{max_items}件のみ表示します。（残り{remaining}件）"
+                elif len(pages) > 1:
+                    shown = f"{number + 1}〜{number + len(page)}" if len(page) > 1 else f"{number + 1}"
+                    body += f"\n表示案件数: {shown} 件目（{page_number}/{len(pages)} 通目）"
+                else:
+                    body += f"\n表示案件数: {len(page)} 件"
 
-            body += """
+                body += """
 
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 ■ 新規案件詳細
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 """
-            
-            for i, item in enumerate(items_to_send, 1):
-                body += f"\n【案件 {i}】\n"
-                body += f"件名: {item['project_name'] or '不明'}\n"
-                body += f"機関名: {item['organization_name'] or '不明'}\n"
-                body += f"カテゴリ: {item['category'] or '不明'}\n"
-                body += f"公示種別: {item['procedure_type'] or '不明'}\n"
-                body += f"公告日: {item['cft_issue_date'] or '不明'}\n"
+                for item in page:
+                    number += 1
+                    body += self.format_notification_item(number, item, summaries.get(item['key']),
+                                                          keyword_hits.get(item['key']), profile)
                 
-                if item['tender_submission_deadline']:
-                    body += f"入札開始日: {item['tender_submission_deadline']}\n"
-                if item['opening_tenders_event']:
-                    body += f"開札日: {item['opening_tenders_event']}\n"
-                if item['period_end_time']:
-                    body += f"納入期限: {item['period_end_time']}\n"
-                if item['location']:
-                    body += f"履行場所: {item['location']}\n"
-                    
-                body += f"URL: {item['external_document_uri'] or '不明'}\n"
-                summary = self.summarize_url(item['external_document_uri'])
-                if summary:
-                    body += f"概要: {summary}\n"
-                body += f"検索キーワード: {item['search_keyword']}\n"
-                body += f"─" * 40 + "\n"
-            
-            body += f"""
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-このメールは自動送信です。
-官公需情報ポータルサイト: http://www.kkj.go.jp/
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-"""
+                if page_number < len(pages):
+                    body += f"\n（{page_number + 1}/{len(pages)} 通目に続きます）\n"
+                bodies.append(body + footer)
         
-        # メール送信
+        subject = self.notification_subject(profile['subject'], len(new_items))
+        if len(bodies) > 1:
+            subjects = [f"{subject} ({i}/{len(bodies)})" for i in range(1, len(bodies) + 1)]
+        else:
+            subjects = [subject]
+        
+        # personalize が true の場合は宛先ごとに個別のメールを作成し、本文に宛名を入れる
+        personalize = notification_config.get('personalize', False)
+        if personalize:
+            recipients = [[to_email] for to_email in profile['to_emails']]
+        else:
+            recipients = [profile['to_emails']]
+        
+        messages = []
+        for to_emails in recipients:
+            greeting = ''
+            if personalize:
+                name, address = parseaddr(to_emails[0])
+                greeting = f"\n{name or address} 様\n"
+            for subject, body, keys in zip(subjects, bodies, page_keys):
+                messages.append((self.create_message(to_emails, subject, greeting + body), keys))
+        return messages
+    
+    def format_notification_item(self, number, item, summary, keywords, profile):
+        """通知メールの案件1件分の本文を作成"""
+        body = f"\n【案件 {number}】\n"
+        body += f"件名: {item['project_name'] or '不明'}\n"
+        body += f"機関名: {item['organization_name'] or '不明'}\n"
+        body += f"カテゴリ: {item['category'] or '不明'}\n"
+        body += f"公示種別: {item['procedure_type'] or '不明'}\n"
+        body += f"公告日: {item['cft_issue_date'] or '不明'}\n"
+        
+        if item['tender_submission_deadline']:
+            body += f"入札開始日: {item['tender_submission_deadline']}\n"
+        if item['opening_tenders_event']:
+            body += f"開札日: {item['opening_tenders_event']}\n"
+        if item['period_end_time']:
+            body += f"納入期限: {item['period_end_time']}\n"
+        if item['location']:
+            body += f"履行場所: {item['location']}\n"
+            
+        body += f"URL: {item['external_document_uri'] or '不明'}\n"
+        if summary:
+            body += f"概要: {summary}\n"
+        # 他のプロファイルのキーワードは表示しない
+        keywords = keywords or [item['search_keyword']]
+        keywords = [k for k in keywords if k in profile['keywords']] or keywords
+        body += f"検索キーワード: {', '.join(keywords)}\n"
+        body += f"─" * 40 + "\n"
+        return body
+    
+    def notification_subject(self, base_subject, count):
+        """件名に件数を含める"""
+        # 「新規案件通知」の部分を置き換える
+        if '新規案件通知' in base_subject:
+            if count:
+                return base_subject.replace('新規案件通知', f'新規案件{count}件')
+            return base_subject.replace('新規案件通知', '新規案件なし')
+        # 「新規案件通知」が含まれていない場合は末尾に追加
+        if count:
+            return f"{base_subject} - 新規案件{count}件"
+        return f"{base_subject} - 新規案件なし"
+    
+    def create_message(self, to_emails, subject, body):
+        """送信元・宛先・件名を設定したメールを作成"""
+        notification_config = self.config['notification']
         msg = MIMEMultipart()
         
         # 送信者名の設定
@@ -422,124 +2462,439 @@ class KKJSearchNotifier:
         else:
             msg['From'] = notification_config['from_email']
             
-        msg['To'] = ', '.join(notification_config['to_emails'])
+        # 宛名付きの宛先（「山田 <yamada@example.com>」）は宛先ごとに宛名をエンコードする
+        # （まとめて設定すると日本語を含むヘッダー全体が1つのエンコード語になり、アドレスを取り出せなくなる）
+        msg['To'] = ', '.join(formataddr(parseaddr(to_email)) for to_email in to_emails)
+        msg['Subject'] = subject
+        msg.attach(MIMEText(body, 'plain', 'utf-8'))
+        return msg
+    
+    def open_smtp(self):
+        """SMTPサーバーに接続してログインした接続を返す"""
+        smtp_config = self.config['smtp']
         
-        # 件名に件数を含める
-        base_subject = notification_config.get('subject', '【官公需】防衛省 新規案件通知')
-        # 「新規案件通知」の部分を置き換える
-        if '新規案件通知' in base_subject:
-            if new_items:
-                msg['Subject'] = base_subject.replace('新規案件通知', f'新規案件{len(new_items)}件')
-            else:
-                msg['Subject'] = base_subject.replace('新規案件通知', '新規案件なし')
+        # タイムアウトを設定（30秒）
+        if smtp_config.get('use_ssl', False):
+            # SSL接続（ポート465用）
+            logger.info(f"SSL接続を使用: {smtp_config['server']}:{smtp_config['port']}")
+            server = smtplib.SMTP_SSL(smtp_config['server'], smtp_config['port'], timeout=30)
+        elif smtp_config.get('use_tls', True):
+            # STARTTLS接続（ポート587用）
+            logger.info(f"STARTTLS接続を使用: {smtp_config['server']}:{smtp_config['port']}")
+            server = smtplib.SMTP(smtp_config['server'], smtp_config['port'], timeout=30)
+            server.starttls()
         else:
-            # 「新規案件通知」が含まれていない場合は末尾に追加
-            if new_items:
-                msg['Subject'] = f"{base_subject} - 新規案件{len(new_items)}件"
-            else:
-                msg['Subject'] = f"{base_subject} - 新規案件なし"
-        
-        msg.attach(MIMEText(body, 'plain', 'utf-8'))
+            # 非暗号化接続
+            logger.info(f"非暗号化接続を使用: {smtp_config['server']}:{smtp_config['port']}")
+            server = smtplib.SMTP(smtp_config['server'], smtp_config['port'], timeout=30)
         
+        logger.info("SMTPサーバーに接続しました")
+        server.login(smtp_config['username'], smtp_config['password'])
+        logger.info("SMTPサーバーにログインしました")
+        return server
+    
+    def envelope_recipients(self, msg):
+        """To ヘッダーから宛名を除いたエンベロープの宛先アドレスを取得"""
+        return [address for _, address in getaddresses(msg.get_all('To', [])) if address]
+    
+    def send_messages(self, messages):
+        """複数のメールを1回のSMTP接続・ログインで送信し、(送信できた件数, エラー内容) を返す"""
+        sent = 0
         try:
-            if new_items:
-                logger.info(f"メール送信を開始します: 新規案件 {len(new_items)} 件")
-            else:
-                logger.info(f"メール送信を開始します: 新規案件なし（通知のみ）")
-            
-            # タイムアウトを設定（30秒）
-            if smtp_config.get('use_ssl', False):
-                # SSL接続（ポート465用）
-                logger.info(f"SSL接続を使用: {smtp_config['server']}:{smtp_config['port']}")
-                server = smtplib.SMTP_SSL(smtp_config['server'], smtp_config['port'], timeout=30)
-            elif smtp_config.get('use_tls', True):
-                # STARTTLS接続（ポート587用）
-                logger.info(f"STARTTLS接続を使用: {smtp_config['server']}:{smtp_config['port']}")
-                server = smtplib.SMTP(smtp_config['server'], smtp_config['port'], timeout=30)
-                server.starttls()
-            else:
-                # 非暗号化接続
-                logger.info(f"非暗号化接続を使用: {smtp_config['server']}:{smtp_config['port']}")
-                server = smtplib.SMTP(smtp_config['server'], smtp_config['port'], timeout=30)
-            
-            logger.info("SMTPサーバーに接続しました")
-            server.login(smtp_config['username'], smtp_config['password'])
-            logger.info("SMTPサーバーにログインしました")
-            
-            server.send_message(msg)
-            server.quit()
-            
-            if new_items:
-                logger.info(f"メール通知を送信しました: 新規案件 {len(new_items)} 件")
-            else:
-                logger.info(f"メール通知を送信しました: 新規案件なし")
+            server = self.open_smtp()
+            try:
+                for msg in messages:
+                    server.send_message(msg, to_addrs=self.envelope_recipients(msg))
+                    sent += 1
+            finally:
+                try:
+                    server.quit()
+                except smtplib.SMTPException:
+                    server.close()
+            return sent, None
             
         except smtplib.SMTPAuthenticationError as e:
-            logger.error(f"SMTP認証エラー: ユーザー名またはパスワードが正しくありません - {str(e)}")
+            error = f"SMTP認証エラー: ユーザー名またはパスワードが正しくありません - {str(e)}"
         except smtplib.SMTPConnectError as e:
-            logger.error(f"SMTP接続エラー: サーバーに接続できません - {str(e)}")
+            error = f"SMTP接続エラー: サーバーに接続できません - {str(e)}"
         except smtplib.SMTPServerDisconnected as e:
-            logger.error(f"SMTPサーバー切断: {str(e)}")
+            error = f"SMTPサーバー切断: {str(e)}"
         except socket.timeout as e:
-            logger.error(f"接続タイムアウト: {str(e)}")
+            error = f"接続タイムアウト: {str(e)}"
         except smtplib.SMTPException as e:
-            logger.error(f"SMTPエラー: {str(e)}")
+            error = f"SMTPエラー: {str(e)}"
         except Exception as e:
-            logger.error(f"メール送信エラー: {type(e).__name__} - {str(e)}")
-            if smtp_config['use_tls']:
-                server = smtplib.SMTP(smtp_config['server'], smtp_config['port'], timeout=30)
-                server.starttls()
-            else:
-                server = smtplib.SMTP(smtp_config['server'], smtp_config['port'], timeout=30)
-            
-            logger.info("SMTPサーバーに接続しました")
-            server.login(smtp_config['username'], smtp_config['password'])
-            logger.info("SMTPサーバーにログインしました")
-            
-            server.send_message(msg)
-            server.quit()
+            error = f"メール送信エラー: {type(e).__name__} - {str(e)}"
+        logger.error(error)
+        if sent:
+            logger.warning(f"{len(messages)} 通中 {sent} 通のみ送信しました")
+        return sent, error
+    
+    def send_deadline_reminder(self, days):
+        """今後 days 日以内の期限をプロファイルごとにまとめてリマインドメールで送信（該当がないプロファイルには送信しない）"""
+        deadlines = self.get_upcoming_deadlines(days)
+        hits = self.get_keyword_hits(list({d['key'] for d in deadlines}))
+        messages = []
+        for profile in self.get_profiles():
+            # プロファイルの機関・キーワードに該当する案件のみ（keyword_hits の導入前の案件は検索キーワードで判定）
+            items = [d for d in deadlines
+                     if any(org in (d['organization_name'] or '') for org in profile['organizations'])
+                     and set(hits.get(d['key'], [d['search_keyword']])) & set(profile['keywords'])]
+            if not items:
+                logger.info(f"プロファイル {profile['name']}: {days}日以内の期限はありません")
+                continue
             
-            logger.info(f"メール通知を送信しました: {len(new_items)} 件")
+            body = f"今後{days}日以内に期限を迎える案件: {len(items)}件\n"
+            body += f"─" * 40 + "\n"
+            for item in items:
+                body += f"\n{item['due']} {item['kind']}\n"
+                body += f"件名: {item['project_name'] or '不明'}\n"
+                body += f"機関名: {item['organization_name'] or '不明'}\n"
+                if item['location']:
+                    body += f"履行場所: {item['location']}\n"
+                body += f"URL: {item['external_document_uri'] or '不明'}\n"
             
-        except smtplib.SMTPAuthenticationError as e:
-            logger.error(f"SMTP認証エラー: ユーザー名またはパスワードが正しくありません - {str(e)}")
-        except smtplib.SMTPConnectError as e:
-            logger.error(f"SMTP接続エラー: サーバーに接続できません - {str(e)}")
-        except smtplib.SMTPException as e:
-            logger.error(f"SMTPエラー: {str(e)}")
-        except Exception as e:
-            logger.error(f"メール送信エラー: {type(e).__name__} - {str(e)}")
+            subject = profile['subject']
+            if '新規案件通知' in subject:
+                subject = subject.replace('新規案件通知', f'期限{len(items)}件（{days}日以内）')
+            else:
+                subject = f"{subject} - 期限{len(items)}件（{days}日以内）"
+            messages.append(self.create_message(profile['to_emails'], subject, body))
+            logger.info(f"プロファイル {profile['name']}: {days}日以内の期限 {len(items)} 件")
+        
+        if not messages:
+            return True
+        sent, error = self.send_messages(messages)
+        if error is None:
+            logger.info(f"期限のリマインドメールを {sent} 通送信しました")
+        return error is None
+    
+    def load_fetch_states(self, organization):
+        """キーワードごとの取得位置（取得済み最新公告日・途中で終了した取得の再開位置）を取得"""
+        cursor = self.get_connection().execute(
+            "SELECT keyword, last_issue_date, resume_before, crawl_latest FROM fetch_state WHERE organization = ?",
+            (organization,))
+        return {keyword: {'last_issue_date': last_issue_date, 'resume_before': resume_before,
+                          'crawl_latest': crawl_latest}
+                for keyword, last_issue_date, resume_before, crawl_latest in cursor}
+    
+    def update_fetch_state(self, organization, keyword, results, complete=True):
+        """取得結果から取得位置を記録
+        
+        全ページを取得できた場合は、途中で終了していた取得も含めて見つかった最新公告日まで取得済みとする。
+        途中で終了した場合は取得済み最新公告日を進めず、取得できた最も古い公告日を再開位置として記録し、
+        次回はそこから遡って続きを取得する。
+        """
+        dated = [r for r in results if r['cft_issue_date']]
+        conn = self.get_connection()
+        row = conn.execute(
+            "SELECT last_issue_date, last_key, resume_before, crawl_latest FROM fetch_state "
+            "WHERE organization = ? AND keyword = ?", (organization, keyword)).fetchone()
+        last_issue_date, last_key, resume_before, crawl_latest = row or (None, None, None, None)
+        if self.full_sync:
+            # 全件再取得では前回の途中の取得を引き継がない
+            resume_before = crawl_latest = None
+        
+        latest = max(dated, key=lambda r: (r['cft_issue_date'][:10], r['key'])) if dated else None
+        newest = max(filter(None, [crawl_latest, latest and latest['cft_issue_date'][:10]]), default=None)
+        if complete:
+            if newest and (not last_issue_date or newest >= last_issue_date):
+                last_issue_date = newest
+                if latest and latest['cft_issue_date'][:10] == newest:
+                    last_key = latest['key']
+            resume_before = crawl_latest = None
+        else:
+            if not dated:
+                return
+            oldest = min(r['cft_issue_date'][:10] for r in dated)
+            if oldest == resume_before:
+                # 同一公告日の案件が1ページの件数を超えるなど、前回から進めない場合はその公告日を飛ばす
+                try:
+                    oldest = (date.fromisoformat(oldest) - timedelta(days=1)).isoformat()
+                except ValueError:
+                    return
+                logger.warning(f"公告日 {resume_before} の案件を取得しきれないため前日から再開します: "
+                               f"{organization} {keyword}")
+            resume_before = oldest
+            crawl_latest = newest
+        
+        try:
+            with conn:
+                conn.execute('''
+                    INSERT INTO fetch_state (organization, keyword, last_issue_date, last_key, resume_before,
+                                             crawl_latest, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                    ON CONFLICT (organization, keyword) DO UPDATE SET
+                        last_issue_date = excluded.last_issue_date,
+                        last_key = excluded.last_key,
+                        resume_before = excluded.resume_before,
+                        crawl_latest = excluded.crawl_latest,
+                        updated_at = excluded.updated_at
+                ''', (organization, keyword, last_issue_date, last_key, resume_before, crawl_latest))
+        except sqlite3.Error as e:
+            logger.error(f"データベースエラー: {str(e)}")
+    
+    def get_since_date(self, last_issue_date):
+        """前回の最新公告日から重複期間を差し引いた取得開始日を計算"""
+        if self.full_sync or not last_issue_date:
+            return None
+        overlap_days = int(self.config.get('fetch', {}).get('overlap_days', 2))
+        try:
+            last = date.fromisoformat(last_issue_date[:10])
+        except ValueError:
+            return None
+        return (last - timedelta(days=overlap_days)).isoformat()
+    
+    def fetch_keyword(self, organization, keyword, since=None, until=None, stop_at_known=False):
+        """キーワードの全ページを取得し、(パース済みの結果, 全ページ取得できたか) を返す"""
+        results = []
+        for page_results in self.search_pages(organization, keyword, since, until, stop_at_known):
+            if page_results is None:
+                return results, False
+            results.extend(page_results)
+        return results, True
+    
+    def get_profiles(self):
+        """通知プロファイルの一覧を取得
+        
+        profiles を省略した場合は organization / keywords / notification から1件作成する。
+        プロファイルで省略した項目も同様に全体の設定を使用する。
+        """
+        notification_config = self.config.get('notification', {})
+        default_schedule = self.config.get('daemon', {}).get('schedule', '0 * * * *')
+        profiles = []
+        for profile in self.config.get('profiles') or [{}]:
+            organizations = profile.get('organizations') or profile.get('organization') or self.config.get('organization')
+            if isinstance(organizations, str):
+                organizations = [organizations]
+            if not organizations:
+                logger.error(f"機関名が設定されていないプロファイルをスキップします: {profile.get('name', '')}")
+                continue
+            profiles.append({
+                'name': profile.get('name') or ', '.join(organizations),
+                'organizations': list(organizations),
+                'keywords': list(profile.get('keywords') or self.config.get('keywords', [])),
+                'to_emails': profile.get('to_emails') or notification_config.get('to_emails', []),
+                'subject': profile.get('subject') or notification_config.get('subject', '【官公需】防衛省 新規案件通知'),
+                'schedule': profile.get('schedule') or default_schedule,
+            })
+        return profiles
+    
+    def plan_queries(self, profiles):
+        """全プロファイルの機関名×キーワードから重複を除いた検索を作成し、(検索のリスト, 機関ごとのキーワード) を返す
+        
+        fetch.plan が broad の場合は機関ごとに1回だけ検索し、キーワードはローカルで照合する。
+        """
+        organization_keywords = {}
+        for profile in profiles:
+            for organization in profile['organizations']:
+                keywords = organization_keywords.setdefault(organization, [])
+                keywords.extend(k for k in profile['keywords'] if k not in keywords)
+        
+        if self.config.get('fetch', {}).get('plan', 'keyword') == 'broad':
+            queries = [(organization, self.BROAD_QUERY) for organization in organization_keywords]
+        else:
+            queries = [(organization, keyword)
+                       for organization, keywords in organization_keywords.items() for keyword in keywords]
+        requested = sum(len(p['organizations']) * len(p['keywords']) for p in profiles)
+        if len(profiles) > 1:
+            logger.info(f"プロファイル {len(profiles)} 件の検索を統合しました: 機関名×キーワード {requested} 件 "
+                        f"-> 重複を除いた検索 {len(queries)} 件")
+        return queries, organization_keywords
+    
+    def fetch_queries(self, queries):
+        """(機関名, キーワード) ごとのAPI検索を並列実行し、完了した順に (機関名, キーワード, 結果, 完了フラグ) を返す
+        
+        キーワードが BROAD_QUERY の場合はキーワードを指定せずに機関の案件を一括取得する。
+        """
+        max_workers = max(1, int(self.config.get('fetch', {}).get('max_workers', 1)))
+        states = {organization: self.load_fetch_states(organization)
+                  for organization in dict.fromkeys(o for o, _ in queries)}
+        if self.full_sync:
+            logger.info("全件再取得モード: 前回の取得位置を使用せずに検索します")
+        if any(keyword == self.BROAD_QUERY for _, keyword in queries):
+            logger.info("機関の新着案件を一括取得し、キーワードはローカルで照合します")
+        logger.info(f"API検索を開始します: 検索 {len(queries)} 件（機関 {len(states)} 件）, 同時実行数 {max_workers}")
+        
+        # 登録済みの案件での打ち切りは、今回の実行より前に登録した案件のみを対象にする
+        self.known_max_id = self.get_connection().execute(
+            "SELECT COALESCE(MAX(id), 0) FROM search_results").fetchone()[0]
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {}
+            for organization, keyword in queries:
+                state = states[organization].get(keyword, {})
+                since = self.get_since_date(state.get('last_issue_date'))
+                # 前回の取得が途中で終了した場合は、その続き（取得できた最も古い公告日以前）から遡る
+                until = None if self.full_sync else state.get('resume_before')
+                if until:
+                    logger.info(f"前回の続きから取得します: {organization} {keyword} (公告日 {until} 以前)")
+                # 前回までの取得が完了している場合のみ、登録済みの案件に達した時点で打ち切る
+                stop_at_known = bool(since) and not until
+                future = executor.submit(self.fetch_keyword, organization,
+                                         None if keyword == self.BROAD_QUERY else keyword,
+                                         since, until, stop_at_known)
+                futures[future] = (organization, keyword)
+            for future in as_completed(futures):
+                results, complete = future.result()
+                yield (*futures[future], results, complete)
     
-    def run(self):
-        """メイン処理"""
+    def match_keywords(self, results, matcher):
+        """件名とキーワードを照合し、(一致した結果, (キー, キーワード) のリスト) を返す"""
+        matched = []
+        keyword_hits = []
+        for result in results:
+            keywords = matcher.find(result['project_name'])
+            # API側の一致判定はローカルの照合と異なる場合があるため、検索キーワードも含める
+            if result['search_keyword'] and result['search_keyword'] not in keywords:
+                keywords.insert(0, result['search_keyword'])
+            if not keywords:
+                continue
+            if not result['search_keyword']:
+                result['search_keyword'] = keywords[0]
+            matched.append(result)
+            keyword_hits.extend((result['key'], keyword) for keyword in keywords)
+        return matched, keyword_hits
+    
+    def run(self, profiles=None):
+        """メイン処理（profiles を指定した場合はそのプロファイルのみ処理）"""
         all_new_items = []
+        # 案件キーごとに検索結果に含まれた機関（複数の機関の検索で同じ案件が見つかる場合がある）
+        item_organizations = {}
         total_searched = 0
+        if profiles is None:
+            profiles = self.get_profiles()
         
-        for keyword in self.config['keywords']:
-            logger.info(f"キーワード '{keyword}' で検索開始")
-            
-            # API検索
-            xml_data = self.search_api(keyword)
-            if not xml_data:
-                continue
-            
-            # 結果をパース
-            results = self.parse_xml_results(xml_data, keyword)
-            logger.info(f"検索結果: {len(results)} 件")
+        # 前回までに送信できなかった通知を先に再送する
+        self.flush_outbox()
+        queries, organization_keywords = self.plan_queries(profiles)
+        matchers = {organization: KeywordMatcher(keywords)
+                    for organization, keywords in organization_keywords.items()}
+        
+        # 検索・パースは並列に実行し、保存は完了したものから順に行う
+        for organization, query, results, complete in self.fetch_queries(queries):
+            label = 'キーワード指定なし' if query == self.BROAD_QUERY else f"キーワード '{query}'"
+            logger.info(f"検索結果: {organization} {label} {len(results)} 件")
             total_searched += len(results)
             
-            # データベースに保存
-            new_items = self.save_to_database(results)
-            logger.info(f"新規案件: {len(new_items)} 件")
+            # データベースに保存（一致した全キーワードを記録）
+            matched, keyword_hits = self.match_keywords(results, matchers[organization])
+            for item in matched:
+                item_organizations.setdefault(item['key'], set()).add(organization)
+            new_items = self.save_to_database(matched, keyword_hits)
+            saved = new_items is not None
+            new_items = new_items or []
+            logger.info(f"新規案件: {organization} {label} {len(new_items)} 件")
             
             all_new_items.extend(new_items)
             
-            # API負荷対策のため少し待機
-            time.sleep(1)
+            # 途中のページで失敗・打ち切った場合は取得位置を進めず、次回は取得できた位置から続きを取得する
+            # 保存に失敗した場合は取得位置を更新しない
+            if saved:
+                self.update_fetch_state(organization, query, results, complete)
         
-        # 検索結果に関わらず通知メールを送信
         logger.info(f"処理完了: 検索総数 {total_searched} 件, 新規案件 {len(all_new_items)} 件")
-        self.send_notification(all_new_items)
+        
+        # 機関名と一致したキーワードでプロファイルごとに振り分け、検索結果に関わらず通知メールを送信
+        # 前回までに通知できなかった未通知の案件も含める（送信前にすべてのプロファイル分を振り分ける）
+        keyword_hits = self.get_keyword_hits([item['key'] for item in all_new_items])
+        routed = []
+        for profile in profiles:
+            keywords = set(profile['keywords'])
+            items = [item for item in all_new_items
+                     if item_organizations[item['key']].intersection(profile['organizations'])
+                     and keywords.intersection(keyword_hits.get(item['key'], [item['search_keyword']]))]
+            backlog = self.get_unnotified_items(profile, exclude_keys=(item['key'] for item in items))
+            if backlog:
+                logger.info(f"プロファイル '{profile['name']}': 前回までに通知できなかった案件 {len(backlog)} 件を通知します")
+            items = backlog + items
+            if len(profiles) > 1:
+                logger.info(f"プロファイル '{profile['name']}': 新規案件 {len(items)} 件")
+            routed.append((profile, items))
+        
+        # 要約は全プロファイルで通知する案件をまとめて1回だけ生成する（プロファイルごとに制限時間を待たない）
+        notification_config = self.config.get('notification', {})
+        limit = None
+        if not notification_config.get('paginate', True):
+            limit = max(1, int(notification_config.get('max_items_per_mail', 50)))
+        to_summarize = {item['key']: item for _, items in routed for item in items[:limit]}
+        summaries = self.summarize_items(list(to_summarize.values())) if to_summarize else {}
+        for profile, items in routed:
+            self.send_notification(items, profile, summaries)
+        self.log_outbox_status()
+        self.http.log_stats()
+        if self.cache is not None:
+            self.cache.log_stats()
+        self.log_extraction_stats()
+    
+    def acquire_lock(self):
+        """多重実行を防ぐためのロックを取得（他のプロセスが実行中の場合は False）"""
+        if fcntl is None:
+            return True
+        lock_path = self.config.get('daemon', {}).get('lock_file', 'kkj_search.lock')
+        lock_file = open(lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self.lock_file = lock_file
+        return True
+    
+    def run_daemon(self):
+        """常駐して設定したスケジュールで検索・通知と要約キューの処理を行う
+        
+        データベース接続・HTTPセッション・キャッシュを保持したまま、毎分スケジュールを確認する。
+        SIGTERM / SIGINT を受信した場合は実行中の処理の完了後に終了する。
+        """
+        daemon_config = self.config.get('daemon', {})
+        try:
+            schedules = [(profile, CronSchedule(profile['schedule'])) for profile in self.get_profiles()]
+            enrich_schedule = daemon_config.get('enrich_schedule')
+            enrich_schedule = CronSchedule(enrich_schedule) if enrich_schedule else None
+        except ValueError as e:
+            logger.error(f"スケジュール設定エラー: {e}")
+            return
+        
+        def handle_signal(signum, frame):
+            logger.info(f"{signal.Signals(signum).name} を受信しました。実行中の処理の完了後に終了します")
+            self.stop_event.set()
+        signal.signal(signal.SIGTERM, handle_signal)
+        signal.signal(signal.SIGINT, handle_signal)
+        
+        for profile, schedule in schedules:
+            logger.info(f"スケジュール: プロファイル '{profile['name']}' {schedule.expression}")
+        if enrich_schedule:
+            logger.info(f"スケジュール: 要約キュー {enrich_schedule.expression}")
+        
+        next_tick = (datetime.now() + timedelta(minutes=1)).replace(second=0, microsecond=0)
+        while not self.stop_event.wait(max(0.0, (next_tick - datetime.now()).total_seconds())):
+            profiles = [profile for profile, schedule in schedules if schedule.matches(next_tick)]
+            if profiles:
+                started = time.monotonic()
+                try:
+                    self.run(profiles)
+                except Exception as e:
+                    logger.error(f"定期実行エラー: {type(e).__name__} - {e}")
+                # 全件再取得は最初の実行のみ
+                self.full_sync = False
+                if self.cache is not None:
+                    self.cache.evict()
+                logger.info(f"定期実行が完了しました: プロファイル {len(profiles)} 件 ({time.monotonic() - started:.1f}秒)")
+            if enrich_schedule and enrich_schedule.matches(next_tick) and not self.stop_event.is_set():
+                try:
+                    self.enrich()
+                except Exception as e:
+                    logger.error(f"要約キュー処理エラー: {type(e).__name__} - {e}")
+            
+            # 処理が次の時刻を過ぎた場合、その間のスケジュールは実行しない（重複実行を防ぐ）
+            following = next_tick + timedelta(minutes=1)
+            current = (datetime.now() + timedelta(minutes=1)).replace(second=0, microsecond=0)
+            if current > following:
+                logger.warning(f"処理時間が長いため {next_tick + timedelta(minutes=1):%H:%M} から "
+                               f"{current - timedelta(minutes=1):%H:%M} までのスケジュールをスキップしました")
+            next_tick = max(following, current)
+        logger.info("常駐モードを終了します")
     
     def test_mail(self):
         """メール送信テスト"""
@@ -590,9 +2945,12 @@ class KKJSearchNotifier:
             raise
     
     def send_test_notification(self, test_items):
-        """テスト用メール通知"""
+        """テスト用メール通知（全プロファイルの宛先に送信）"""
         smtp_config = self.config['smtp']
         notification_config = self.config['notification']
+        profiles = self.get_profiles()
+        organizations = list(dict.fromkeys(o for p in profiles for o in p['organizations']))
+        to_emails = list(dict.fromkeys(e for p in profiles for e in p['to_emails']))
         
         # メール本文の作成
         now = datetime.now().strftime('%Y年%m月%d日 %H:%M')
@@ -603,7 +2961,7 @@ class KKJSearchNotifier:
 実際の案件情報ではありません。
 
 テスト実行日時: {now}
-機関名: {self.config['organization']}
+機関名: {', '.join(organizations)}
 テスト案件数: {len(test_items)} 件
 
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━
@@ -641,7 +2999,7 @@ class KKJSearchNotifier:
 - SMTPサーバー: {smtp_config['server']}:{smtp_config['port']}
 - TLS: {'有効' if smtp_config['use_tls'] else '無効'}
 - 送信元: {notification_config['from_email']}
-- 送信先: {', '.join(notification_config['to_emails'])}
+- 送信先: {', '.join(to_emails)}
 
 このメールが正常に受信できていれば、
 メール送信機能は正しく設定されています。
@@ -649,34 +3007,12 @@ class KKJSearchNotifier:
 """
         
         # メール送信
-        msg = MIMEMultipart()
-        
-        # 送信者名の設定
-        from_name = notification_config.get('from_name', '')
-        if from_name:
-            msg['From'] = formataddr((from_name, notification_config['from_email']))
-        else:
-            msg['From'] = notification_config['from_email']
-            
-        msg['To'] = ', '.join(notification_config['to_emails'])
-        msg['Subject'] = '【テスト】' + notification_config['subject']
-        msg.attach(MIMEText(body, 'plain', 'utf-8'))
+        msg = self.create_message(to_emails, '【テスト】' + profiles[0]['subject'], body)
         
         try:
             logger.info(f"テストメール送信を開始します")
-            
-            # タイムアウトを設定（30秒）
-            if smtp_config['use_tls']:
-                server = smtplib.SMTP(smtp_config['server'], smtp_config['port'], timeout=30)
-                server.starttls()
-            else:
-                server = smtplib.SMTP(smtp_config['server'], smtp_config['port'], timeout=30)
-            
-            logger.info("SMTPサーバーに接続しました")
-            server.login(smtp_config['username'], smtp_config['password'])
-            logger.info("SMTPサーバーにログインしました")
-            
-            server.send_message(msg)
+            server = self.open_smtp()
+            server.send_message(msg, to_addrs=self.envelope_recipients(msg))
             server.quit()
             
             logger.info(f"テストメールを送信しました")
@@ -698,12 +3034,39 @@ if __name__ == "__main__":
     import argparse
     
     parser = argparse.ArgumentParser(description='官公需情報検索・通知システム')
+    parser.add_argument('command', nargs='?', choices=['query', 'deadlines'],
+                       help='query: 保存済み・アーカイブ済みの案件を全文検索（例: kkj_search.py query "サイバー 調査"）/ '
+                            'deadlines: 期限が近い案件を表示（アーカイブ済みを除く、例: kkj_search.py deadlines --days 7）')
+    parser.add_argument('terms', nargs='*',
+                       help='query の検索語（空白区切りの語をすべて含む案件を検索）')
+    parser.add_argument('--limit', type=int, default=20,
+                       help='query で表示する最大件数（デフォルト: 20）')
+    parser.add_argument('--no-archive', action='store_true',
+                       help='query と併用: kkj_maintenance.py --archive で移動した案件を検索しない（データベースのみ検索）')
+    parser.add_argument('--archive', action='store_true',
+                       help='互換のため残しているオプション（query は既定でアーカイブも検索）')
+    parser.add_argument('--days', type=int, default=7,
+                       help='deadlines で対象とする日数（今日から N 日後まで、デフォルト: 7）')
+    parser.add_argument('--mail', action='store_true',
+                       help='deadlines と併用: 期限をプロファイルの宛先にリマインドメールで送信')
     parser.add_argument('--no-mail', action='store_true', 
                        help='メール送信をスキップ（テスト用）')
     parser.add_argument('--test-mail', action='store_true',
                        help='テストメールを送信（メール設定の確認用）')
     parser.add_argument('--config', default='config.json',
                        help='設定ファイルのパス（デフォルト: config.json）')
+    parser.add_argument('--full-sync', action='store_true',
+                       help='前回の取得位置を使用せずに全件を再取得')
+    parser.add_argument('--enrich', action='store_true',
+                       help='要約キューを処理（検索・通知は行わない）')
+    parser.add_argument('--daemon', action='store_true',
+                       help='常駐して daemon.schedule / プロファイルの schedule に従って定期実行')
+    parser.add_argument('--flush-outbox', action='store_true',
+                       help='送信待ちの通知メールを再送（検索は行わない）')
+    parser.add_argument('--batch', action='store_true',
+                       help='--enrich と併用: OpenAI Batch API で要約キューをまとめて処理')
+    parser.add_argument('--wait', action='store_true',
+                       help='--enrich --batch と併用: 投入したバッチの完了まで待機')
     
     args = parser.parse_args()
     
@@ -717,15 +3080,94 @@ if __name__ == "__main__":
         logger.info("=== テストメール送信完了 ===")
         sys.exit(0)
     
+    # 要約キュー処理モード
+    if args.enrich:
+        logger.info("=== 要約キュー処理モード ===")
+        if args.batch:
+            notifier.enrich_batch(wait_for_completion=args.wait)
+        else:
+            notifier.enrich()
+        notifier.close()
+        sys.exit(0)
+    
+    # 保存済み案件の全文検索
+    if args.command == 'query':
+        started = time.perf_counter()
+        results = notifier.search_local(' '.join(args.terms), limit=args.limit)
+        archived = []
+        # データベースに残っている案件を優先し、表示件数に満たない分だけアーカイブを検索してその後に表示する
+        search_archive = not args.no_archive and len(results) < args.limit
+        if search_archive:
+            archived = notifier.search_archive(' '.join(args.terms), limit=args.limit - len(results),
+                                               exclude_keys={result['key'] for result in results})
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        for i, result in enumerate(results + archived, 1):
+            label = '[アーカイブ] ' if i > len(results) else ''
+            print(f"{i}. {label}[{(result['cft_issue_date'] or '')[:10]}] {result['organization_name'] or '不明'} "
+                  f"{result['project_name'] or '不明'}")
+            if result['location']:
+                print(f"   履行場所: {result['location']}")
+            print(f"   URL: {result['external_document_uri'] or '不明'}")
+            if result['summary']:
+                print(f"   概要: {' '.join(result['summary'].split())[:100]}")
+        if search_archive:
+            print(f"検索結果: {len(results)} 件、アーカイブ: {len(archived)} 件 ({elapsed_ms:.1f} ms)")
+        else:
+            print(f"検索結果: {len(results)} 件 ({elapsed_ms:.1f} ms)")
+        notifier.close()
+        sys.exit(0)
+    
+    # 期限が近い案件の表示・リマインド
+    if args.command == 'deadlines':
+        if args.mail:
+            logger.info("=== 期限リマインドモード ===")
+            success = notifier.send_deadline_reminder(args.days)
+            notifier.close()
+            sys.exit(0 if success else 1)
+        started = time.perf_counter()
+        deadlines = notifier.get_upcoming_deadlines(args.days)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        for deadline in deadlines:
+            print(f"{deadline['due']:<16} {deadline['kind']:<5} {deadline['organization_name'] or '不明'} "
+                  f"{deadline['project_name'] or '不明'}")
+            print(f"   URL: {deadline['external_document_uri'] or '不明'}")
+        print(f"今後{args.days}日以内の期限: {len(deadlines)} 件 ({elapsed_ms:.1f} ms)")
+        notifier.close()
+        sys.exit(0)
+    
+    # 送信待ちの通知メールの再送モード
+    if args.flush_outbox:
+        logger.info("=== 通知メール再送モード ===")
+        notifier.flush_outbox()
+        notifier.log_outbox_status()
+        notifier.close()
+        sys.exit(0)
+    
     # メール送信を無効化（テスト用）
     if args.no_mail:
         logger.info("メール送信は無効化されています（テストモード）")
-        def skip_notification(items):
+        def skip_notification(items, profile=None):
             if items:
                 logger.info(f"メール送信をスキップ: 新規案件 {len(items)} 件")
             else:
                 logger.info(f"メール送信をスキップ: 新規案件なし")
         notifier.send_notification = skip_notification
+        notifier.flush_outbox = lambda: True
+    
+    # 実行中の検索・常駐プロセスとの重複実行を防ぐ
+    if not notifier.acquire_lock():
+        logger.warning("他のプロセスが実行中のため終了します（--daemon で常駐している場合は cron での実行は不要です）")
+        notifier.close()
+        sys.exit(0)
+    notifier.full_sync = args.full_sync
+    
+    # 常駐モード
+    if args.daemon:
+        logger.info("=== 常駐モード ===")
+        notifier.run_daemon()
+        notifier.close()
+        sys.exit(0)
     
     # 通常実行
-    notifier.run()
\ No newline at end of file
+    notifier.run()
+    notifier.close()
\ No newline at end of file
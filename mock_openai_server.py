@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+OpenAI API モックサーバー
+OpenAI APIを呼び出さずに要約処理（通常の要約・Batch API）を試験するためのローカルサーバーです。
+config.json の openai.base_url に http://127.0.0.1:8765/v1 のように指定して使用します。
+"""
+
+import argparse
+import itertools
+import json
+import sys
+import threading
+import time
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 応答する要約の項目（kkj_search.py の SUMMARY_PROMPT と同じ順序）
+SUMMARY_FIELDS = [
+    '案件の概要', '履行期間', '要求元', '入札方式', '参加表明期限',
+    '履行体制に関する資料提出期限', '提案書などの提出期限', '入札日時', '入札制限の記載',
+]
+
+class MockState:
+    """アップロードされたファイルとバッチを保持"""
+    def __init__(self, latency, batch_delay):
+        self.latency = latency
+        self.batch_delay = batch_delay
+        self.files = {}
+        self.batches = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.RLock()
+        self.requests = 0
+
+    def new_id(self, prefix):
+        with self.lock:
+            return f"{prefix}-mock{next(self.ids)}"
+
+def chat_completion(body):
+    """Chat Completions のモック応答を作成"""
+    prompt = ''.join(message.get('content', '') for message in body.get('messages', []))
+    content = '\n'.join(f"{field}：（モック応答）" for field in SUMMARY_FIELDS)
+    prompt_tokens = max(1, len(prompt) // 2)
+    completion_tokens = max(1, len(content) // 2)
+    return {
+        "id": f"chatcmpl-mock{int(time.time() * 1000)}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get('model', 'mock'),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+def file_object(file_id, entry):
+    """ファイルオブジェクトの応答を作成"""
+    return {
+        "id": file_id,
+        "object": "file",
+        "bytes": len(entry['content']),
+        "created_at": entry['created_at'],
+        "filename": entry['filename'],
+        "purpose": entry['purpose'],
+        "status": "processed",
+    }
+
+def run_batch(state, batch):
+    """バッチの入力ファイルを処理して出力ファイルを作成"""
+    lines = state.files[batch['input_file_id']]['content'].decode('utf-8').splitlines()
+    output = []
+    for line in lines:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        output.append(json.dumps({
+            "id": f"batch_req-mock{len(output) + 1}",
+            "custom_id": request['custom_id'],
+            "response": {
+                "status_code": 200,
+                "request_id": f"req-mock{len(output) + 1}",
+                "body": chat_completion(request.get('body', {})),
+            },
+            "error": None,
+        }, ensure_ascii=False))
+
+    output_file_id = state.new_id('file')
+    state.files[output_file_id] = {
+        'content': ('\n'.join(output) + '\n').encode('utf-8'),
+        'filename': 'batch_output.jsonl',
+        'purpose': 'batch_output',
+        'created_at': int(time.time()),
+    }
+    batch.update({
+        "status": "completed",
+        "output_file_id": output_file_id,
+        "completed_at": int(time.time()),
+        "request_counts": {"total": len(output), "completed": len(output), "failed": 0},
+    })
+
+class MockHandler(BaseHTTPRequestHandler):
+    """OpenAI API の一部エンドポイントを模擬するハンドラー"""
+    state = None
+
+    def log_message(self, format, *args):
+        print(f"  {self.command} {self.path} -> {args[1] if len(args) > 1 else ''}")
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status, message):
+        self.send_json({"error": {"message": message, "type": "invalid_request_error"}}, status)
+
+    def read_body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def do_POST(self):
+        state = self.state
+        with state.lock:
+            state.requests += 1
+        path = self.path.split('?')[0]
+
+        if path.endswith('/chat/completions'):
+            body = json.loads(self.read_body() or b'{}')
+            if state.latency:
+                time.sleep(state.latency)
+            self.send_json(chat_completion(body))
+
+        elif path.endswith('/files'):
+            # multipart/form-data（purpose と file）を解析
+            header = f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode('utf-8')
+            message = BytesParser(policy=policy.HTTP).parsebytes(header + self.read_body())
+            fields = {}
+            for part in message.iter_parts():
+                fields[part.get_param('name', header='content-disposition')] = part
+            if 'file' not in fields:
+                self.send_error_json(400, "file is required")
+                return
+            file_id = state.new_id('file')
+            state.files[file_id] = {
+                'content': fields['file'].get_payload(decode=True),
+                'filename': fields['file'].get_filename() or 'upload.jsonl',
+                'purpose': fields['purpose'].get_payload(decode=True).decode('utf-8') if 'purpose' in fields else 'batch',
+                'created_at': int(time.time()),
+            }
+            self.send_json(file_object(file_id, state.files[file_id]))
+
+        elif path.endswith('/batches'):
+            body = json.loads(self.read_body() or b'{}')
+            if body.get('input_file_id') not in state.files:
+                self.send_error_json(400, "input_file_id not found")
+                return
+            batch_id = state.new_id('batch')
+            state.batches[batch_id] = {
+                "id": batch_id,
+                "object": "batch",
+                "endpoint": body.get('endpoint'),
+                "input_file_id": body['input_file_id'],
+                "completion_window": body.get('completion_window', '24h'),
+                "status": "in_progress",
+                "output_file_id": None,
+                "error_file_id": None,
+                "created_at": int(time.time()),
+                "request_counts": {"total": 0, "completed": 0, "failed": 0},
+            }
+            self.send_json(state.batches[batch_id])
+
+        else:
+            self.send_error_json(404, f"unknown endpoint: {path}")
+
+    def do_GET(self):
+        state = self.state
+        path = self.path.split('?')[0]
+        parts = path.rstrip('/').split('/')
+
+        if len(parts) >= 2 and parts[-2] == 'batches':
+            batch = state.batches.get(parts[-1])
+            if batch is None:
+                self.send_error_json(404, "batch not found")
+                return
+            # 指定秒数が経過したバッチを完了させる
+            with state.lock:
+                if batch['status'] == 'in_progress' and time.time() - batch['created_at'] >= state.batch_delay:
+                    run_batch(state, batch)
+            self.send_json(batch)
+
+        elif len(parts) >= 3 and parts[-1] == 'content' and parts[-3] == 'files':
+            entry = state.files.get(parts[-2])
+            if entry is None:
+                self.send_error_json(404, "file not found")
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(len(entry['content'])))
+            self.end_headers()
+            self.wfile.write(entry['content'])
+
+        elif len(parts) >= 2 and parts[-2] == 'files':
+            entry = state.files.get(parts[-1])
+            if entry is None:
+                self.send_error_json(404, "file not found")
+                return
+            self.send_json(file_object(parts[-1], entry))
+
+        else:
+            self.send_error_json(404, f"unknown endpoint: {path}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='OpenAI API モックサーバー')
+    parser.add_argument('--host', default='127.0.0.1',
+                       help='待ち受けるアドレス（デフォルト: 127.0.0.1）')
+    parser.add_argument('--port', type=int, default=8765,
+                       help='待ち受けるポート（デフォルト: 8765）')
+    parser.add_argument('--latency', type=float, default=0.0,
+                       help='Chat Completions の応答を遅らせる秒数（API呼び出しの所要時間の模擬）')
+    parser.add_argument('--batch-delay', type=float, default=0.0,
+                       help='バッチが完了するまでの秒数')
+    args = parser.parse_args()
+
+    MockHandler.state = MockState(args.latency, args.batch_delay)
+    server = ThreadingHTTPServer((args.host, args.port), MockHandler)
+    print("OpenAI API モックサーバー v1.0")
+    print("=" * 40)
+    print(f"base_url: http://{args.host}:{args.port}/v1")
+    print("終了するには Ctrl+C を押してください")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n終了します（リクエスト数: {MockHandler.state.requests}）")
+        server.server_close()
+        sys.exit(0)
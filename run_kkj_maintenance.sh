@@ -9,5 +9,5 @@ eval "$(pyenv virtualenv-init -)"
 # プロジェクトディレクトリに移動
 cd ~/projects/kkj_search
 
-# メンテナンススクリプトを実行
-python kkj_maintenance.py --delete-days 90 --vacuum >> maintenance.log 2>&1
+# メンテナンススクリプトを実行（90日以前のデータはアーカイブへ移動）
+python kkj_maintenance.py --delete-days 90 --archive --vacuum >> maintenance.log 2>&1